@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+db_writer.py  –  spooled, batched MySQL writer for lap commits
+  • submit() appends a whole lap to the local write-ahead spool (spool.py)
+    and returns – no network, so the ring keeps its lap rate even while
+    MySQL is slow or down
+  • a drainer thread pushes the oldest spooled rows to MySQL in large
+    batches: one executemany + one commit into the readings table
+    (storage.py), INSERT IGNORE on the row's key, then acks the batch
+  • each row is stamped with its node id and a UTC timestamp when it is
+    spooled, so a replay writes exactly the row the first attempt would have
+  • after an outage the backlog is replayed in bulk; replays are safe
+    because every row keeps its uid
+  • the rows a batch really inserted are folded into the per-minute and
+    per-hour rollup tables (rollup.py) in the same commit
+  • close() tries one last drain, anything left stays spooled for next run
+"""
+import threading
+from datetime import datetime, timezone
+import mysql.connector
+import rollup, storage
+from spool import Spool, SPOOL_PATH, new_uid
+
+DRAIN_BATCH  = 5000     # spooled rows pushed per round trip
+DRAIN_IDLE   = 1.0      # s the drainer sleeps when the spool is empty
+RETRY_PAUSE  = 2        # s before the first retry while the DB is unreachable
+RETRY_MAX    = 60       # s cap for the exponential retry backoff
+
+
+def reading_row(reading: dict, topo_json: str | None = None) -> tuple:
+    """Metric and topology columns of one reading, in storage.COLUMNS order."""
+    return (reading.get("temperature"),
+            reading.get("humidity"),
+            reading.get("wind_speed"),
+            reading.get("soil_moisture"),
+            reading.get("topology_state") or topo_json)
+
+
+class LapWriter:
+    """
+    The spool is the only thing callers touch; the MySQL connection is owned
+    by the drainer thread alone.  With db=None nothing is drained and the
+    spool is the store (hardware-free runs, ring_bench).
+    """
+
+    def __init__(self, db: dict, spool_path: str = SPOOL_PATH, batch: int = DRAIN_BATCH):
+        self.db     = db
+        self.batch  = batch
+        self.spool  = Spool(spool_path)
+        self.conn   = None
+        self.schema_ready = False
+        self.wake   = threading.Event()
+        self.stop   = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="db-drainer", daemon=True)
+        self.lock   = threading.Lock()     # guards the spool hand-off in close()
+        self.running   = False
+        self.abandoned = False             # close() gave up waiting: the drainer closes the spool
+
+    def start(self):
+        if self.db is None:
+            return self
+        if len(self.spool):
+            print(f"[db] {len(self.spool)} spooled rows from an earlier run will be replayed")
+        self.running = True
+        self.thread.start()
+        return self
+
+    def submit(self, rows: list[tuple[int, tuple]]) -> bool:
+        """Spool one lap: a list of (node_id, reading_row) pairs.  Local disk only."""
+        if not rows:
+            return True
+        ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+        self.spool.append([(storage.TABLE, new_uid(), (node_id, ts, *row))
+                           for node_id, row in rows])
+        self.wake.set()
+        return True
+
+    def close(self, timeout: float | None = 10):
+        """
+        One last drain attempt, then stop; undelivered rows stay spooled.
+        If the drainer is still pushing after `timeout`, it finishes that
+        batch, stops and closes the spool itself.
+        """
+        self.stop.set()
+        self.wake.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        with self.lock:
+            if self.running:
+                self.abandoned = True
+                print("[db] drainer still pushing, it closes the spool when done")
+                return
+        if self.db is not None and len(self.spool):
+            print(f"[db] {len(self.spool)} rows left in the spool for next run")
+        self.spool.close()
+
+    # ── drainer thread ─────────────────────────────────────────────────────
+    def _run(self):
+        try:
+            self._drain()
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+            with self.lock:
+                self.running = False
+                if self.abandoned:
+                    self.spool.close()
+
+    def _drain(self):
+        backoff = RETRY_PAUSE
+        while True:
+            batch = self.spool.peek(self.batch)
+            if not batch:
+                if self.stop.is_set():
+                    return
+                self.wake.wait(DRAIN_IDLE)
+                self.wake.clear()
+                continue
+            try:
+                self._push(batch)
+            except mysql.connector.Error as e:
+                print(f"[db] drain failed ({len(self.spool)} rows spooled): {e!r}")
+                self.conn = None
+                if self.stop.is_set():
+                    return
+                self.stop.wait(backoff)
+                backoff = min(RETRY_MAX, backoff * 2)
+                continue
+            backoff = RETRY_PAUSE
+            self.spool.ack(batch[-1][0])
+            if self.abandoned:
+                return
+
+    def _push(self, batch):
+        if self.conn is None or not self.conn.is_connected():
+            self.conn = mysql.connector.connect(**self.db)
+        rows = [(*vals, uid) for _, _, uid, vals in batch]
+        cur = self.conn.cursor()
+        try:
+            if not self.schema_ready:
+                storage.ensure_schema(cur)
+                storage.ensure_partitions(cur)
+                rollup.ensure_tables(cur)
+                self.schema_ready = True
+            uids = [row[-1] for row in rows]
+            seen = rollup.existing_uids(cur, uids)
+            cur.executemany(storage.INSERT, rows)
+            rollup.add_rows(cur, [u for u in uids if u not in seen])
+            self.conn.commit()
+        finally:
+            cur.close()
@@ -1,59 +1,111 @@
 #!/usr/bin/env python3
 """
 web-app.py  –  Flask dashboard for piSenseDB + Open-Meteo forecast
+The page loads once and then follows /stream (Server-Sent Events): one
+publisher thread refreshes the shared caches and pushes small JSON deltas
+(changed chart versions and values, ring changes, forecast) to every viewer.
+The forecast is fetched in the background (stale-while-revalidate), so no
+request ever waits on the weather API.
+/api/readings[.csv] serves the history itself: downsampled series per node
+and metric over any time range (see series.py), as JSON or CSV.
 """
 from flask import Flask, render_template_string, Response, request
-import pandas as pd, matplotlib.pyplot as plt, io, base64, requests, mysql.connector
-from datetime import datetime, timedelta, date
-import svgwrite, math, json                          
+import pandas as pd, matplotlib.pyplot as plt, io, requests, mysql.connector
+from datetime import datetime, timedelta, date, timezone
+import svgwrite, math, json, threading, time, hashlib, queue
+from storage import TABLE
+import series
 DB = dict(host="192.168.0.132", port=3306,
           user="primaryPi", password="theeIoTofGoats!", database="piSenseDB")
 
-TABLES   = ["sensor_readings1", "sensor_readings2", "sensor_readings3"]
 METRICS  = ["temperature", "humidity", "soil_moisture", "wind_speed"]
 LABELS   = {"temperature": "°C", "humidity": "%", "wind_speed": "m s⁻¹", "soil_moisture": "U"}
 LAT, LON = 37.0, -122.06
 TIME_HRS = 24
+REFRESH_SECS = 15          # how stale the shared cache may get before a refetch
+KEEPALIVE    = 15          # s between SSE comments on an idle stream
+SUB_BACKLOG  = 16          # deltas queued per viewer before it is dropped
+FC_TTL       = 3600        # s a fetched forecast counts as fresh
+FC_RETRY     = (30, 1800)  # s before retrying a failed fetch: first, longest
+FC_TIMEOUT   = 10          # s per weather API request (background thread only)
 
 app = Flask(__name__)
 ring_state = ["Pi1", "Pi2", "Pi3"]       
 
 
-def db_to_frame():
-    cnx = mysql.connector.connect(**DB)
-    stop, start = datetime.utcnow(), datetime.utcnow() - timedelta(hours=TIME_HRS)
-    frames = []
-    for idx, tbl in enumerate(TABLES, 1):
-        q = (f"SELECT ts, temperature, humidity, wind_speed, soil_moisture "
-             f"FROM {tbl} WHERE ts BETWEEN %s AND %s")
-        df = pd.read_sql(q, cnx, params=(start, stop), parse_dates=["ts"])
-        if not df.empty:
-            df["node"] = f"Pi{idx}"
-            frames.append(df)
-    cnx.close()
-    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
-
-
-def latest_topology() -> list[str] | None:
-    cnx = mysql.connector.connect(**DB)
-    cur = cnx.cursor()
-    newest_ts, newest_json = None, None
-    for tbl in TABLES:
-        cur.execute(
-            f"SELECT ts, topology_state "
-            f"FROM {tbl} WHERE topology_state IS NOT NULL "
-            f"ORDER BY ts DESC LIMIT 1"
-        )
-        row = cur.fetchone()
-        if row and (newest_ts is None or row[0] > newest_ts):
-            newest_ts, newest_json = row
-    cnx.close()
-    if newest_json:
+class SummaryCache:
+    """
+    Shared in-process copy of what the page shows: per-node count and sum of
+    every metric over the last TIME_HRS hours, plus the newest topology.
+    The numbers come from the rollup_minute table (see rollup.py), summed
+    SQL-side, so a refresh reads one row per node however many raw samples
+    and nodes there are; the topology is the newest row of the readings
+    table (storage.py).  Two queries per refresh for any ring size.  All
+    viewers read the same copy, and at most one refresh runs at a time –
+    everyone else is served the current copy meanwhile.
+    """
+
+    QUERY = ("SELECT node, " +
+             ", ".join(f"SUM({m}_n), SUM({m}_sum)" for m in METRICS) +
+             " FROM rollup_minute WHERE bucket >= %s GROUP BY node ORDER BY node")
+
+    def __init__(self, hours=TIME_HRS, refresh=REFRESH_SECS):
+        self.window  = timedelta(hours=hours)
+        self.refresh = refresh
+        self.lock    = threading.Lock()
+        self.checked = 0.0                # monotonic time of last refresh
+        self.version = 0                  # bumped whenever the held numbers change
+        self.stats   = pd.DataFrame(columns=["node"] + [f"{m}_{p}" for m in METRICS
+                                                          for p in ("n", "sum")])
+        self.topology = None
+
+    def _pull(self):
+        cnx = mysql.connector.connect(**DB)
         try:
-            return json.loads(newest_json)
+            cur = cnx.cursor()
+            cur.execute(self.QUERY, (datetime.utcnow() - self.window,))
+            rows = cur.fetchall()
+            cur.execute(f"SELECT topology_state FROM {TABLE} "
+                        f"WHERE topology_state IS NOT NULL ORDER BY ts DESC LIMIT 1")
+            newest = cur.fetchone()
+            cur.close()
+        finally:
+            cnx.close()
+        stats = pd.DataFrame([(f"Pi{node}", *(float(v or 0) for v in vals))
+                              for node, *vals in rows], columns=self.stats.columns)
+        try:
+            topology = json.loads(newest[0]) if newest else None
         except Exception:
-            pass
-    return None
+            topology = None
+        if stats.equals(self.stats) and topology == self.topology:
+            return
+        self.stats, self.topology = stats, topology
+        self.version += 1
+
+    def _fresh(self):
+        if time.monotonic() - self.checked >= self.refresh:
+            # single-flight: if someone else is refreshing, serve what we hold
+            if self.lock.acquire(blocking=self.checked == 0.0):
+                try:
+                    if time.monotonic() - self.checked >= self.refresh:
+                        self._pull()
+                        self.checked = time.monotonic()
+                except Exception as e:
+                    print(f"[cache] refresh failed: {e!r}")
+                finally:
+                    self.lock.release()
+
+    def frame(self) -> pd.DataFrame:
+        """One row per node: {metric}_n and {metric}_sum over the window."""
+        self._fresh()
+        return self.stats
+
+    def latest_topology(self) -> list[str] | None:
+        self._fresh()
+        return self.topology
+
+
+cache = SummaryCache()
 
 
 def normalize_labels(nodes: list[str]) -> list[str]:
@@ -64,25 +116,74 @@ def normalize_labels(nodes: list[str]) -> list[str]:
     return out
 
 
-_fc, _ts = None, datetime.min
-def forecast_today():
-    global _fc, _ts
-    if (datetime.utcnow() - _ts).seconds < 3600 and _fc:
-        return _fc
-    try:
-        url = (f"https://api.open-meteo.com/v1/forecast?latitude={LAT}&longitude={LON}"
-               "&daily=temperature_2m_max,weathercode,windspeed_10m_max,relative_humidity_2m_max"
-               "&temperature_unit=celsius&windspeed_unit=ms&timezone=auto"
-               f"&start_date={date.today()}&end_date={date.today()}")
-        d = requests.get(url, timeout=10).json()["daily"]
-        _fc = dict(weathercode=d["weathercode"][0], temperature=d["temperature_2m_max"][0],
-                   humidity=d["relative_humidity_2m_max"][0], wind_speed=d["windspeed_10m_max"][0],
-                   soil_moisture=None)
-    except Exception as e:
-        print(f"[wx] forecast fetch failed: {e}")
-        _fc = {}
-    _ts = datetime.utcnow()
-    return _fc
+def open_meteo() -> dict:
+    """Today's forecast from Open-Meteo; raises on any failure."""
+    url = (f"https://api.open-meteo.com/v1/forecast?latitude={LAT}&longitude={LON}"
+           "&daily=temperature_2m_max,weathercode,windspeed_10m_max,relative_humidity_2m_max"
+           "&temperature_unit=celsius&windspeed_unit=ms&timezone=auto"
+           f"&start_date={date.today()}&end_date={date.today()}")
+    d = requests.get(url, timeout=FC_TIMEOUT).json()["daily"]
+    return dict(weathercode=d["weathercode"][0], temperature=d["temperature_2m_max"][0],
+                humidity=d["relative_humidity_2m_max"][0], wind_speed=d["windspeed_10m_max"][0],
+                soil_moisture=None)
+
+
+class Forecast:
+    """
+    Stale-while-revalidate holder of today's forecast.  get() never blocks:
+    it returns what is held ({} before the first success) and, when that is
+    older than FC_TTL or from another day, starts one background fetch.  A
+    failed fetch keeps the old forecast and is not retried for FC_RETRY[0]
+    seconds, doubling up to FC_RETRY[1] while the source keeps failing.
+    `source` is any callable returning the forecast dict (open_meteo, or a
+    local stub in tests).
+    """
+
+    def __init__(self, source=open_meteo, ttl=FC_TTL, retry=FC_RETRY):
+        self.source  = source
+        self.ttl     = ttl
+        self.retry   = retry
+        self.lock    = threading.Lock()
+        self.value   = {}
+        self.day     = None               # date the held forecast is for
+        self.fetched = None               # monotonic time of the last success
+        self.backoff = 0.0
+        self.next_try = 0.0               # no fetch before this monotonic time
+        self.running = False
+
+    def stale(self) -> bool:
+        return (self.fetched is None or self.day != date.today()
+                or time.monotonic() - self.fetched >= self.ttl)
+
+    def get(self) -> dict:
+        with self.lock:
+            if self.stale() and not self.running and time.monotonic() >= self.next_try:
+                self.running = True
+                threading.Thread(target=self._refresh, name="forecast", daemon=True).start()
+            return self.value
+
+    def _refresh(self):
+        try:
+            value = self.source()
+        except Exception as e:
+            with self.lock:
+                self.backoff  = min(max(self.backoff * 2, self.retry[0]), self.retry[1])
+                self.next_try = time.monotonic() + self.backoff
+                self.running  = False
+            print(f"[wx] forecast fetch failed, retrying in {self.backoff:.0f}s: {e}")
+            return
+        with self.lock:
+            self.value, self.day = value, date.today()
+            self.fetched = time.monotonic()
+            self.backoff, self.next_try = 0.0, 0.0
+            self.running = False
+
+
+forecast = Forecast()
+
+
+def forecast_today() -> dict:
+    return forecast.get()
 
 
 WX_EMOJI = {0: "☀️", 1: "⛅", 2: "⛅", 3: "☁️", 45: "🌫️", 48: "🌫️",
@@ -91,24 +192,65 @@ WX_EMOJI = {0: "☀️", 1: "⛅", 2: "⛅", 3: "☁️", 45: "🌫️", 48: "
 def wx_icon(code): return WX_EMOJI.get(code, "🌡️")
 
 
-def make_bar(df: pd.DataFrame, metric: str, fcst_val):
-    if df.empty or df[metric].dropna().empty:
-        per_pi = pd.Series(dtype=float)
-    else:
-        per_pi = df.groupby("node")[metric].mean().sort_index()
-
-    bars, labels = per_pi.tolist(), per_pi.index.tolist()
-    bars.append(df[metric].mean()); labels.append("Avg")
+def bar_values(stats: pd.DataFrame, metric: str, fcst_val):
+    """(labels, bar heights) for one metric – this is what a chart is keyed on."""
+    n, total = stats[f"{metric}_n"], stats[f"{metric}_sum"]
+    seen = stats[n > 0]
+    bars   = (seen[f"{metric}_sum"] / seen[f"{metric}_n"]).tolist()
+    labels = seen["node"].tolist()
+    bars.append(total.sum() / n.sum() if n.sum() else None); labels.append("Avg")
     if fcst_val is not None:
         bars.append(fcst_val); labels.append("Forecast")
+    return tuple(labels), tuple(None if b is None or pd.isna(b) else round(float(b), 3) for b in bars)
 
+
+def make_bar(metric: str, labels, bars) -> bytes:
+    has_fc = labels[-1] == "Forecast"
+    n_pi   = len(labels) - 1 - has_fc
     plt.figure(figsize=(3.2, 3))
-    colors = (["#1e88e5"] * len(per_pi)) + ["#555555"] + (["#ff9900"] if fcst_val is not None else [])
-    plt.bar(range(len(bars)), bars, color=colors, width=0.55)
+    colors = (["#1e88e5"] * n_pi) + ["#555555"] + (["#ff9900"] if has_fc else [])
+    plt.bar(range(len(bars)), [math.nan if b is None else b for b in bars], color=colors, width=0.55)
     plt.xticks(range(len(labels)), labels, rotation=25, ha="right")
     plt.ylabel(LABELS[metric]); plt.title(metric.replace("_", " ").title(), fontsize=10); plt.tight_layout()
     buf = io.BytesIO(); plt.savefig(buf, format="png"); plt.close()
-    return base64.b64encode(buf.getvalue()).decode()
+    return buf.getvalue()
+
+
+class ChartCache:
+    """
+    One rendered PNG per metric, keyed on the values it shows.  A chart is
+    only re-drawn when its bars (or the forecast) change; the ETag is a hash
+    of those values, so browsers revalidate with a 304 and no image bytes.
+    """
+
+    def __init__(self):
+        self.lock   = threading.Lock()     # pyplot is not thread-safe
+        self.charts = {}                   # metric → (etag, png, last_modified)
+        self.values = (None, {})           # (data key, {metric: (labels, bars)})
+
+    def current_values(self):
+        stats, fc = cache.frame(), forecast_today()
+        key = (cache.version, tuple(sorted((m, fc.get(m)) for m in METRICS)))
+        if self.values[0] != key:
+            self.values = (key, {m: bar_values(stats, m, fc.get(m)) for m in METRICS})
+        return self.values[1]
+
+    def get(self, metric: str):
+        labels, bars = self.current_values()[metric]
+        etag = hashlib.sha1(json.dumps([metric, labels, bars]).encode()).hexdigest()[:16]
+        hit = self.charts.get(metric)
+        if hit and hit[0] == etag:
+            return hit
+        with self.lock:
+            hit = self.charts.get(metric)
+            if not (hit and hit[0] == etag):
+                png = make_bar(metric, labels, bars)
+                hit = (etag, png, datetime.now(timezone.utc).replace(microsecond=0))
+                self.charts[metric] = hit
+        return hit
+
+
+charts = ChartCache()
 
 
 def ring_svg(nodes: list[str]) -> str:
@@ -139,6 +281,105 @@ def ring_svg(nodes: list[str]) -> str:
     return dwg.tostring()
 
 
+class LiveHub:
+    """
+    Fan-out for /stream.  A single publisher thread (started with the first
+    viewer) refreshes the caches every REFRESH_SECS and compares the page
+    state with the last one; only what changed is pushed, to every viewer's
+    queue.  A ring posted to /topology-update is pushed at once.  A viewer
+    that falls SUB_BACKLOG deltas behind is dropped – its EventSource
+    reconnects and starts again from a full state.
+    """
+
+    def __init__(self, interval=REFRESH_SECS):
+        self.interval = interval
+        self.lock     = threading.Lock()
+        self.subs     = set()
+        self.state    = None
+        self.db_ring  = None
+        self.ring     = None               # newest of DB topology and posted ring
+        self.thread   = None
+
+    def current_ring(self) -> list[str]:
+        db_ring = cache.latest_topology()
+        if db_ring != self.db_ring:        # the ring itself moved on since the last post
+            self.db_ring = db_ring
+            if db_ring:
+                self.ring = normalize_labels(db_ring)
+        return self.ring or ring_state
+
+    def snapshot(self) -> dict:
+        values = charts.current_values()
+        ring   = self.current_ring()
+        return dict(charts={m: charts.get(m)[0] for m in METRICS},
+                    values={m: dict(zip(("labels", "bars"), values[m])) for m in METRICS},
+                    ring=ring, svg=ring_svg(ring), fcst=forecast_today())
+
+    def _start(self):
+        # caller holds self.lock
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="live-hub", daemon=True)
+            self.thread.start()
+
+    def full(self) -> dict:
+        with self.lock:
+            self._start()
+            if self.state is None:
+                self.state = self.snapshot()
+            return dict(self.state)
+
+    def _publish(self, new: dict):
+        with self.lock:
+            old = self.state or {}
+            delta = {}
+            for k, v in new.items():
+                if isinstance(v, dict) and isinstance(old.get(k), dict) and k != "fcst":
+                    changed = {m: x for m, x in v.items() if old[k].get(m) != x}
+                    if changed:
+                        delta[k] = changed
+                elif old.get(k) != v:
+                    delta[k] = v
+            self.state = {**old, **new}
+            if not delta:
+                return
+            delta["ts"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            msg = json.dumps(delta)
+            for q in list(self.subs):
+                try:
+                    q.put_nowait(msg)
+                except queue.Full:
+                    self.subs.discard(q)
+                    with q.mutex:          # make room to wake its generator, which ends
+                        q.queue.clear()
+                    q.put_nowait(None)
+
+    def ring_posted(self, ring: list[str]):
+        self.ring = ring
+        self._publish(dict(ring=ring, svg=ring_svg(ring)))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._publish(self.snapshot())
+            except Exception as e:
+                print(f"[live] publish failed: {e!r}")
+
+    def subscribe(self) -> queue.Queue:
+        q = queue.Queue(maxsize=SUB_BACKLOG)
+        with self.lock:
+            self.subs.add(q)
+            self._start()
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subs.discard(q)
+
+
+hub = LiveHub()
+
+
 TEMPLATE = TEMPLATE = """
 <!doctype html>
 <html lang="en">
@@ -146,7 +387,6 @@ TEMPLATE = TEMPLATE = """
   <meta charset="utf-8">
   <title>Sensor Measurements Dashboard</title>
   <meta name="viewport" content="width=device-width,initial-scale=1">
-  <meta http-equiv="refresh" content="60">
   <style>
     :root{--bg:#1e293b;--panel:#273349;--txt:#e2e8f0}
     body{margin:0;font:16px/1.4 system-ui;background:var(--bg);color:var(--txt)}
@@ -165,25 +405,47 @@ TEMPLATE = TEMPLATE = """
 <div class="grid">
   <!-- Forecast card -->
   <div class="card">
-    <div class="wx">{{icon}}</div>
+    <div class="wx" id="wx-icon">{{icon}}</div>
     <h2>{{location}}</h2>
-    <p style="font-size:2rem;margin:4px 0">{{fcst.temperature}}°</p>
-    <p>{{weekday}} • High {{fcst.temperature}}°<br>
-       Hum {{fcst.humidity}}% • Wind {{fcst.wind_speed}}&nbsp;m/s</p>
+    <p style="font-size:2rem;margin:4px 0"><span class="fc-temp">{{fcst.temperature}}</span>°</p>
+    <p>{{weekday}} • High <span class="fc-temp">{{fcst.temperature}}</span>°<br>
+       Hum <span id="fc-hum">{{fcst.humidity}}</span>% •
+       Wind <span id="fc-wind">{{fcst.wind_speed}}</span>&nbsp;m/s</p>
   </div>
 
-  {% for m,img in bars.items() %}
-    <div class="card"><img src="data:image/png;base64,{{img}}"></div>
+  {% for m,etag in bars.items() %}
+    <div class="card"><img id="chart-{{m}}" src="/chart/{{m}}.png?v={{etag}}" alt="{{m}}"></div>
   {% endfor %}
 </div>
 
 <p style="text-align:center;font-size:.8rem;margin:20px">
-  Updated {{ts}} – auto refresh every 60 s
+  Updated <span id="updated">{{ts}}</span> – <span id="live">live</span>
 </p>
 <h2 style="text-align:center;margin-top:0">Current&nbsp;Topology</h2>
-<div style="display:flex;justify-content:center">
+<div style="display:flex;justify-content:center" id="ring">
   {{ ring_svg|safe }}
 </div>
+<script>
+  const WX = {{ wx_emoji|tojson }};
+  const es = new EventSource("/stream");
+  const set = (sel, v) => document.querySelectorAll(sel).forEach(e => e.textContent = v ?? "");
+  es.onmessage = ev => {
+    const d = JSON.parse(ev.data);
+    for (const [m, etag] of Object.entries(d.charts || {}))
+      document.getElementById("chart-" + m).src = `/chart/${m}.png?v=${etag}`;
+    for (const [m, v] of Object.entries(d.values || {}))
+      document.getElementById("chart-" + m).title =
+        v.labels.map((l, i) => `${l}: ${v.bars[i] ?? "–"}`).join("\n");
+    if (d.svg) document.getElementById("ring").innerHTML = d.svg;
+    if (d.fcst) {
+      set(".fc-temp", d.fcst.temperature); set("#fc-hum", d.fcst.humidity);
+      set("#fc-wind", d.fcst.wind_speed); set("#wx-icon", WX[d.fcst.weathercode] ?? "🌡️");
+    }
+    if (d.ts) set("#updated", d.ts);
+    set("#live", "live");
+  };
+  es.onerror = () => set("#live", "reconnecting…");
+</script>
 </body></html>"""
 
 @app.post("/topology-update")
@@ -192,32 +454,167 @@ def topo_update():
     j = request.get_json(force=True, silent=True) or {}
     ring_state = j.get("ring", ring_state)
     print("[topology] updated to", ring_state)
+    hub.ring_posted(ring_state)
     return ("", 204)
 
 
 @app.route("/")
 def index():
-    df, fc = db_to_frame(), forecast_today()
-    bars = {m: make_bar(df, m, fc.get(m)) for m in METRICS}
-
-    db_ring = latest_topology()
-    svg_nodes = normalize_labels(db_ring) if db_ring else ring_state
+    state = hub.full()
+    fc = state["fcst"]
 
     return render_template_string(
         TEMPLATE,
-        bars=bars,
-        ring_svg=ring_svg(svg_nodes),
+        bars=state["charts"],
+        ring_svg=state["svg"],
         fcst=fc,
         icon=wx_icon(fc.get("weathercode", 0)),
+        wx_emoji=WX_EMOJI,
         weekday=datetime.now().strftime("%A"),
         location="Santa Cruz",
         ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     )
 
 
+@app.route("/chart/<metric>.png")
+def chart(metric):
+    if metric not in METRICS:
+        return Response("unknown metric", 404)
+    etag, png, modified = charts.get(metric)
+    resp = Response(png, mimetype="image/png")
+    resp.set_etag(etag)
+    resp.last_modified = modified
+    if request.args.get("v") == etag:
+        # versioned URL from the page: its bytes can never change
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 86400
+    else:
+        resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+def _when(arg: str, default: datetime) -> datetime:
+    """?arg= as naive UTC: ISO 8601 (naive means UTC) or unix seconds."""
+    v = request.args.get(arg)
+    if not v:
+        return default
+    try:
+        secs = float(v)
+    except ValueError:
+        secs = None
+    if secs is not None:
+        try:
+            return datetime.utcfromtimestamp(secs)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"{arg}={v} is out of range") from None
+    d = datetime.fromisoformat(v)
+    return d.astimezone(timezone.utc).replace(tzinfo=None) if d.tzinfo else d
+
+
+def _csv_arg(arg: str) -> list[str]:
+    return [x.strip() for x in request.args.get(arg, "").split(",") if x.strip()]
+
+
+@app.route("/api/readings")
+@app.route("/api/readings.<fmt>")
+def api_readings(fmt=None):
+    """
+    Downsampled history.  Query parameters, all optional:
+      node    1,3 or Pi1,Pi3 (default: every node)
+      metric  comma list of METRICS (default: all)
+      start, end   ISO 8601 or unix seconds, UTC (default: the last TIME_HRS)
+      points  target points per series (default series.DEFAULT_POINTS)
+      method  buckets (n/mean/min/max per bucket) or lttb (representative points)
+      format  json or csv, or use /api/readings.csv
+    """
+    fmt = fmt or request.args.get("format", "json")
+    try:
+        nodes   = sorted({int(n.removeprefix("Pi")) for n in _csv_arg("node")})
+        metrics = _csv_arg("metric") or METRICS
+        end     = _when("end", datetime.utcnow())
+        start   = _when("start", end - timedelta(hours=TIME_HRS))
+        points  = min(max(int(request.args.get("points", series.DEFAULT_POINTS)), 10),
+                      series.MAX_POINTS)
+        method  = request.args.get("method", "buckets")
+    except ValueError as e:
+        return Response(f"bad parameter: {e}\n", 400)
+    if set(metrics) - set(METRICS) or method not in series.METHODS \
+            or fmt not in ("json", "csv") or start >= end:
+        return Response("bad parameter: see the docstring of api_readings\n", 400)
+
+    try:
+        start, end, width, table = series.plan(start, end, points, method)
+    except OverflowError:                   # rounded out to whole buckets past datetime's range
+        return Response("bad parameter: time range out of range\n", 400)
+    try:
+        cnx = mysql.connector.connect(**DB)
+    except Exception as e:
+        print(f"[api] database unavailable: {e!r}")
+        return Response("database unavailable\n", 503)
+    try:
+        cur = cnx.cursor()
+        key = [nodes, metrics, str(start), str(end), points, method, fmt,
+               series.version(cur, table, start, end, nodes)]
+        etag = hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16]
+        if request.if_none_match.contains(etag):
+            cur.close(); cnx.close()
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            return resp
+        cur.execute(*series.query(table, start, end, width, nodes, metrics))
+    except Exception:
+        cnx.close()
+        raise
+
+    def body():
+        try:
+            items = series.series(cur, metrics, start, width, method, points)
+            if fmt == "csv":
+                yield from series.to_csv(items, method)
+            else:
+                yield from series.to_json(dict(start=start.isoformat() + "Z", end=end.isoformat() + "Z",
+                                               method=method, source=table, bucket_seconds=width),
+                                          items)
+        finally:
+            cur.close()
+            cnx.close()
+
+    resp = Response(body(), mimetype="text/csv" if fmt == "csv" else "application/json")
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = True      # late rows (a drained spool) can still change a range
+    return resp
+
+
+@app.route("/stream")
+def stream():
+    """SSE: the full state once, then deltas as the publisher finds them."""
+    q = hub.subscribe()
+
+    def events():
+        try:
+            yield f"retry: 5000\ndata: {json.dumps(hub.full())}\n\n"
+            while True:
+                try:
+                    msg = q.get(timeout=KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if msg is None:             # too far behind, dropped by the hub
+                    return
+                yield f"data: {msg}\n\n"
+        finally:
+            hub.unsubscribe(q)
+
+    resp = Response(events(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
 @app.route("/healthz")
 def ok(): return Response("OK", 200)
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    forecast.get()                      # start the first fetch before any viewer arrives
+    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+failure_detector.py  –  deadlines learned from observed ring timings
+  • AdaptiveTimeout keeps a sliding window of observed durations (lap
+    gaps, connect times) and sets its deadline to
+        clamp(floor, percentile(window) * factor + margin, ceiling)
+  • until MIN_SAMPLES observations exist it answers the conservative
+    `initial` value, so a fresh node behaves like the old fixed timeouts
+"""
+from collections import deque
+
+MIN_SAMPLES = 5
+WINDOW      = 64
+
+
+class AdaptiveTimeout:
+    def __init__(self, initial, floor, ceiling, percentile=0.99, factor=2.0,
+                 margin=0.0, window=WINDOW):
+        self.initial    = initial
+        self.floor      = floor
+        self.ceiling    = ceiling
+        self.percentile = percentile
+        self.factor     = factor
+        self.margin     = margin
+        self.samples    = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        if seconds >= 0:
+            self.samples.append(seconds)
+
+    @property
+    def ready(self) -> bool:
+        return len(self.samples) >= MIN_SAMPLES
+
+    def quantile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self) -> float:
+        if not self.ready:
+            return self.initial
+        t = self.quantile(self.percentile) * self.factor + self.margin
+        return min(self.ceiling, max(self.floor, t))
+
+    def reset(self):
+        """Forget history, e.g. after the ring grew (RingNode._apply_view)."""
+        self.samples.clear()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+membership.py  –  versioned ring membership carried on the token
+  • every node keeps a view: for each member, alive or dead plus an
+    incarnation number; the ring is the configured order (then joiners in
+    the order first seen) restricted to live members
+  • the view rides on every token it forwards, so a change seen by one
+    node – a dead successor, a rejoin – reaches every member within a lap
+    and nobody else has to time out on the same node
+  • merge rules (as in SWIM): the higher incarnation wins, at equal
+    incarnation "dead" wins; a node told it is dead at its own incarnation
+    refutes it by moving to the next one
+  • only entries that differ from (alive, 0) are carried, so a healthy
+    ring's tokens carry an epoch and nothing else; a joiner enters at
+    incarnation 1, so its join is carried too
+"""
+
+ALIVE, DEAD = 1, 0
+
+
+class Membership:
+    def __init__(self, me: str, order: list[str]):
+        self.me    = me
+        self.order = list(order)
+        if me not in self.order:
+            self.order.append(me)
+        self.state = {}                 # addr → (ALIVE|DEAD, incarnation), non-default only
+        self.epoch = 0                  # bumped on every change this node sees
+
+    def get(self, addr) -> tuple[int, int]:
+        return self.state.get(addr, (ALIVE, 0))
+
+    def alive(self, addr) -> bool:
+        return addr == self.me or self.get(addr)[0] == ALIVE
+
+    def ring(self) -> list[str]:
+        return [a for a in self.order if self.alive(a)]
+
+    def _set(self, addr, status, inc):
+        if addr not in self.order:
+            self.order.append(addr)
+        if (status, inc) == (ALIVE, 0):
+            self.state.pop(addr, None)
+        else:
+            self.state[addr] = (status, inc)
+
+    def mark_dead(self, addrs) -> bool:
+        """This node found addrs unreachable."""
+        changed = False
+        for a in addrs:
+            if a != self.me and self.alive(a):
+                self._set(a, DEAD, self.get(a)[1])
+                changed = True
+        if changed:
+            self.epoch += 1
+        return changed
+
+    def revive(self, addr) -> bool:
+        """
+        addr was heard from directly (it sent us a token): it is alive.  A
+        node new to the view starts at incarnation 1, not the default
+        (alive, 0) that payload() leaves out, so the join rides on the token.
+        """
+        status, inc = self.get(addr)
+        known = addr in self.order
+        if addr == self.me or (known and status == ALIVE):
+            return False
+        self._set(addr, ALIVE, inc + 1 if status == DEAD or not known else inc)
+        self.epoch += 1
+        return True
+
+    def merge(self, payload: dict | None) -> bool:
+        """Fold a view received on a token into ours; True if ours changed."""
+        if not payload:
+            return False
+        changed = False
+        for addr, (status, inc) in payload.get("m", {}).items():
+            if addr == self.me:
+                mine = self.get(addr)[1]
+                if status == DEAD and inc >= mine:
+                    self._set(addr, ALIVE, inc + 1)     # refute: we are here
+                    changed = True
+                elif inc > mine:
+                    self._set(addr, ALIVE, inc)
+                continue
+            cur_status, cur_inc = self.get(addr)
+            if addr not in self.order or inc > cur_inc or (
+                    inc == cur_inc and status == DEAD and cur_status == ALIVE):
+                self._set(addr, status, inc)
+                changed = True
+        self.epoch = max(self.epoch, payload.get("e", 0)) + changed
+        return changed
+
+    def payload(self) -> dict:
+        """What goes on the token: epoch and the non-default entries."""
+        view = {"e": self.epoch}
+        if self.state:
+            view["m"] = {a: list(v) for a, v in self.state.items()}
+        return view
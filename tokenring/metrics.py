@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+metrics.py  –  per-node hot-path timings and counters
+  • Metrics holds one latency histogram per token-path stage (accept wait,
+    decode, sensor read, DB insert, plot, forward) and plain counters
+    (timeouts, topology changes, laps, ...)
+  • serve() exposes them on a small local HTTP endpoint:
+        /metrics       Prometheus text format (for a scraper)
+        /metrics.json  the same numbers as JSON (for the dashboard)
+  • recording is a few additions under a lock, cheap enough for every hop
+"""
+import json, threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX  = "tokenring"
+# upper bounds in seconds; the last bucket (+Inf) catches the rest
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGES   = ("accept_wait", "decode", "sensor_read", "db_insert", "plot", "forward")
+COUNTERS = ("tokens_received", "tokens_invalid", "tokens_duplicate", "tokens_stale",
+            "tokens_forwarded", "forward_failures", "bytes_sent", "laps", "timeouts",
+            "topology_changes", "nodes_removed", "nodes_added")
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum    = 0.0
+        self.count  = 0
+        self.max    = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.sum   += seconds
+        self.count += 1
+        self.max    = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile (Prometheus-style)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+class Metrics:
+    """Thread-safe: stages are timed on the loop and in to_thread workers."""
+
+    def __init__(self, node: str = ""):
+        self.node     = node
+        self.started  = time.time()
+        self.lock     = threading.Lock()
+        self.hist     = {s: Histogram() for s in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, stage: str, seconds: float):
+        with self.lock:
+            self.hist[stage].observe(seconds)
+
+    def inc(self, counter: str, n: int = 1):
+        with self.lock:
+            self.counters[counter] += n
+
+    @contextmanager
+    def time(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    # ── export ─────────────────────────────────────────────────────────────
+    def snapshot(self) -> dict:
+        with self.lock:
+            stages = {s: dict(count=h.count, sum=h.sum, max=h.max,
+                              p50=h.quantile(0.5), p99=h.quantile(0.99),
+                              buckets=list(zip(h.bounds, h.counts)) + [("+Inf", h.counts[-1])])
+                      for s, h in self.hist.items()}
+            counters = dict(self.counters)
+        return dict(node=self.node, uptime=time.time() - self.started,
+                    stages=stages, counters=counters)
+
+    def prometheus(self) -> str:
+        snap  = self.snapshot()
+        label = f'node="{self.node}"'
+        out   = [f"# TYPE {PREFIX}_stage_seconds histogram"]
+        for stage, h in snap["stages"].items():
+            seen = 0
+            for bound, n in h["buckets"]:
+                seen += n
+                out.append(f'{PREFIX}_stage_seconds_bucket{{{label},stage="{stage}",le="{bound}"}} {seen}')
+            out.append(f'{PREFIX}_stage_seconds_sum{{{label},stage="{stage}"}} {h["sum"]}')
+            out.append(f'{PREFIX}_stage_seconds_count{{{label},stage="{stage}"}} {h["count"]}')
+        for name, v in snap["counters"].items():
+            out.append(f"# TYPE {PREFIX}_{name}_total counter")
+            out.append(f"{PREFIX}_{name}_total{{{label}}} {v}")
+        out.append(f"# TYPE {PREFIX}_uptime_seconds gauge")
+        out.append(f"{PREFIX}_uptime_seconds{{{label}}} {snap['uptime']:.1f}")
+        return "\n".join(out) + "\n"
+
+
+def serve(metrics: Metrics, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Start the metrics endpoint on a daemon thread; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                body, ctype = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+            elif path == "/metrics.json":
+                body, ctype = json.dumps(metrics.snapshot()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):       # keep scrapes out of the node's log
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[metrics] serving on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+plot_engine.py  –  per-round scatter plots without rebuilding the figure
+  • PlotEngine builds the 2×2 figure, its axes and two scatter artists per
+    metric (readings, and gray × for missing ones) once; a round only moves
+    their offsets and recolours them
+  • everything else (axes, ticks, grid, titles) is rendered once and kept
+    as a background bitmap: a round restores it, draws the points on top
+    and writes the pixels out as PNG
+  • y limits are sticky – kept while the readings fit and the axis is not
+    far too wide – so the background is redrawn only when they move or the
+    set of nodes changes, which is rare next to the round rate
+  • history=N also keeps a rolling line chart of the last N rounds, one
+    line per node, overwritten each round as <prefix>-history.png; its x
+    window advances in jumps of about N/2 rounds for the same reason
+  • pyplot is passed in, so callers keep deciding where (and in which
+    process) matplotlib gets imported
+"""
+import math
+from collections import deque
+import numpy as np
+
+METRICS = ("temperature", "humidity", "soil_moisture", "wind_speed")
+TITLES  = ("Temperature (°C)", "Humidity (%)", "Soil Moisture", "Wind Speed (m/s)")
+PALETTE = ("red", "blue", "orange", "purple", "brown", "cyan")
+MISSING = "gray"
+MARGIN  = 0.25      # y padding, as a fraction of the data range, when limits move
+SLACK   = 4         # limits are tightened once wider than SLACK × what is needed
+
+
+def values_with_avg(readings) -> dict:
+    """{metric: [value per reading (None if missing) ..., mean of the present ones]}"""
+    out = {}
+    for m in METRICS:
+        vals  = [r.get(m) if r else None for r in readings]
+        clean = [v for v in vals if v is not None]
+        out[m] = vals + [sum(clean) / len(clean) if clean else None]
+    return out
+
+
+def sticky_limits(cur, vals):
+    """
+    y limits for vals: cur when it still holds them with at least half a
+    MARGIN to spare (so markers at the edge are not clipped) and is at most
+    SLACK times wider than needed, otherwise new ones with a MARGIN on each side.
+    """
+    vals = [v for v in vals if v is not None and not math.isnan(v)]
+    if not vals:
+        return cur or (0.0, 1.0)
+    lo, hi = min(vals), max(vals)
+    pad = (hi - lo) * MARGIN or abs(hi) * 0.05 or 1.0
+    if (cur and cur[0] <= lo - pad / 2 and hi + pad / 2 <= cur[1]
+            and cur[1] - cur[0] <= SLACK * (hi - lo + 2 * pad)):
+        return cur
+    return lo - pad, hi + pad
+
+
+def _xy(points):
+    return np.array(points, dtype=float).reshape(-1, 2)
+
+
+class _Blit:
+    """
+    One figure whose `artists` change every round and whose other contents
+    rarely do.  Set .stale when the rest changed (limits, ticks, legend);
+    save() then redraws everything, otherwise only the artists.
+    """
+
+    def __init__(self, plt, fig):
+        self.plt, self.fig = plt, fig
+        self.canvas  = fig.canvas
+        self.artists = []
+        self.bg      = None
+        self.stale   = True
+
+    def add(self, artist):
+        artist.set_animated(True)           # left out of full draws, blitted instead
+        self.artists.append(artist)
+        self.stale = True
+        return artist
+
+    def remove(self, artist):
+        self.artists.remove(artist)
+        artist.remove()
+        self.stale = True
+
+    def save(self, fname):
+        if self.stale or self.bg is None:
+            self.canvas.draw()
+            self.bg    = self.canvas.copy_from_bbox(self.fig.bbox)
+            self.stale = False
+        else:
+            self.canvas.restore_region(self.bg)
+        for a in self.artists:
+            a.axes.draw_artist(a)
+        self.plt.imsave(fname, np.asarray(self.canvas.buffer_rgba()), dpi=self.fig.dpi)
+
+
+class PlotEngine:
+    """
+    Plots of the METRICS, one axes each, titled `titles` and (if given)
+    with y axis labels `ylabels`, in METRICS order.
+    """
+
+    def __init__(self, plt, prefix="token-plot", titles=TITLES, ylabels=None, history=0):
+        self.prefix  = prefix
+        self.labels  = None
+        self.fig, axes = plt.subplots(2, 2, figsize=(10, 8))
+        self.axes    = axes.flatten()
+        self.blit    = _Blit(plt, self.fig)
+        self.points, self.missing = [], []
+        ylabels = ylabels or ("",) * len(METRICS)
+        for ax, title, ylabel in zip(self.axes, titles, ylabels):
+            ax.set_title(title)
+            ax.set_ylabel(ylabel)
+            ax.grid(True, linestyle="--", alpha=0.3)
+            self.points.append(self.blit.add(ax.scatter([], [], s=80)))
+            self.missing.append(self.blit.add(ax.scatter([], [], marker="x", color=MISSING, s=100)))
+
+        self.history = history
+        if history:
+            self.hfig, haxes = plt.subplots(2, 2, figsize=(10, 8))
+            self.haxes  = haxes.flatten()
+            self.hblit  = _Blit(plt, self.hfig)
+            for ax, title, ylabel in zip(self.haxes, titles, ylabels):
+                ax.set_title(title)
+                ax.set_xlabel("round")
+                ax.set_ylabel(ylabel)
+                ax.grid(True, linestyle="--", alpha=0.3)
+            self.hfig.tight_layout()
+            self.rounds = deque(maxlen=history)
+            self.series = {}                # label → one deque of values per metric
+            self.lines  = {}                # label → one Line2D per metric
+
+    def render(self, labels, colors, values, round_num) -> str:
+        """
+        Draw one round: values[metric][i] is labels[i]'s reading (None when
+        missing), plotted in colors[i].  Returns the PNG's file name.
+        """
+        if labels != self.labels:
+            self._relabel(labels)
+        for ax, pts, gaps, m in zip(self.axes, self.points, self.missing, METRICS):
+            vals   = values[m]
+            lo, hi = self._ylim(self.blit, ax, vals)
+            pts.set_offsets(_xy([(x, v) for x, v in enumerate(vals) if v is not None]))
+            pts.set_facecolors([c for c, v in zip(colors, vals) if v is not None])
+            gaps.set_offsets(_xy([(x, lo + 0.05 * (hi - lo))
+                                  for x, v in enumerate(vals) if v is None]))
+        fname = f"{self.prefix}-{round_num}.png"
+        self.blit.save(fname)
+        if self.history:
+            self._roll(labels, colors, values, round_num)
+        return fname
+
+    @staticmethod
+    def _ylim(blit, ax, vals):
+        cur = ax.get_ylim() if blit.bg is not None else None   # first round: no limits yet
+        lim = sticky_limits(cur, vals)
+        if lim != cur:
+            ax.set_ylim(*lim)
+            blit.stale = True
+        return lim
+
+    def _relabel(self, labels):
+        self.labels = list(labels)
+        xs = range(len(labels))
+        self.fig.set_size_inches(max(10, len(labels)), 8)
+        for ax in self.axes:
+            ax.set_xticks(xs)
+            ax.set_xticklabels(labels)
+            ax.set_xlim(-0.5, len(labels) - 0.5)
+        self.fig.tight_layout()
+        self.blit.bg = None                 # new canvas size: old background is useless
+
+    def _roll(self, labels, colors, values, round_num):
+        self.rounds.append(round_num)
+        now = {label: i for i, label in enumerate(labels)}
+        legend = False
+        for label, color in zip(labels, colors):
+            if label not in self.series:
+                pad = [math.nan] * (len(self.rounds) - 1)
+                self.series[label] = [deque(pad, maxlen=self.history) for _ in METRICS]
+                self.lines[label]  = [self.hblit.add(ax.plot([], [], color=color, label=label)[0])
+                                      for ax in self.haxes]
+                legend = True
+        for label in list(self.series):
+            i = now.get(label)
+            for series, m in zip(self.series[label], METRICS):
+                v = values[m][i] if i is not None else None
+                series.append(math.nan if v is None else v)
+            if all(math.isnan(v) for s in self.series[label] for v in s):
+                # gone for the whole window: drop its lines
+                for line in self.lines.pop(label):
+                    self.hblit.remove(line)
+                del self.series[label]
+                legend = True
+        if legend:
+            # blitted after the lines, so it stays readable on top of them
+            old = self.haxes[0].get_legend()
+            if old is not None:
+                self.hblit.artists.remove(old)
+            self.hblit.add(self.haxes[0].legend(loc="upper left", fontsize="small"))
+
+        xs = list(self.rounds)
+        x0, x1 = self.haxes[0].get_xlim()
+        if self.hblit.bg is None or xs[0] < x0 or xs[-1] > x1:
+            span = max(xs[-1] - xs[0], self.history - 1)
+            for ax in self.haxes:
+                ax.set_xlim(xs[0] - 0.5, xs[0] + 1.5 * span + 0.5)
+            self.hblit.stale = True
+        for k, ax in enumerate(self.haxes):
+            for label, lines in self.lines.items():
+                lines[k].set_data(xs, self.series[label][k])
+            self._ylim(self.hblit, ax, [v for s in self.series.values() for v in s[k]])
+        self.hblit.save(f"{self.prefix}-history.png")
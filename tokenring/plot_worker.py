@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+plot_worker.py  –  renders lap plots in a separate process
+  • the ring process only pushes (data, round) snapshots onto a small queue
+  • the worker drains the queue before every render and draws only the
+    newest lap, so a slow Pi skips stale laps instead of falling behind
+  • matplotlib is imported inside the worker process only; the ring
+    process never pays the import or render cost
+  • the worker keeps one plot_engine.PlotEngine for its lifetime, so a lap
+    only updates artists and saves the PNG
+"""
+import multiprocessing as mp
+import queue
+
+BACKLOG = 4        # snapshots buffered before the oldest is discarded
+
+_STOP = None
+
+
+def plot_token(token, round_num, engine):
+    from plot_engine import PALETTE, values_with_avg
+    labels = [f"Node{i+1}" for i in range(len(token))] + ["Avg"]
+    colors = [PALETTE[i % len(PALETTE)] for i in range(len(token))] + ["black"]
+    fname  = engine.render(labels, colors, values_with_avg(token), round_num)
+    print(f"[+] saved {fname}")
+
+
+def _worker(q, history):
+    import matplotlib
+    matplotlib.use("Agg")                  # headless Pi, no display
+    import matplotlib.pyplot as plt
+    from plot_engine import PlotEngine
+    engine = PlotEngine(plt, history=history)
+
+    stop = False
+    while not stop:
+        snap = q.get()
+        # coalesce: skip straight to the newest lap that is waiting
+        while True:
+            try:
+                nxt = q.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _STOP:
+                stop = True
+            else:
+                snap = nxt
+        if snap is _STOP:
+            return
+        data, round_num = snap
+        try:
+            plot_token(data, round_num, engine)
+        except Exception as e:
+            print(f"[plot] round {round_num} failed: {e!r}")
+
+
+class PlotWorker:
+    """
+    Callable like plot_token(data, round_num), but never blocks on rendering.
+    history=N adds the rolling N-lap chart token-plot-history.png.
+    """
+
+    def __init__(self, backlog: int = BACKLOG, history: int = 0):
+        ctx = mp.get_context("spawn")      # fresh interpreter, nothing inherited
+        self.q    = ctx.Queue(maxsize=backlog)
+        self.proc = ctx.Process(target=_worker, args=(self.q, history),
+                                name="plot-worker", daemon=True)
+
+    def start(self):
+        self.proc.start()
+        return self
+
+    def __call__(self, data, round_num):
+        while True:
+            try:
+                self.q.put_nowait((data, round_num))
+                return
+            except queue.Full:
+                # make room by discarding the oldest snapshot; the worker
+                # would have skipped it anyway
+                try:
+                    self.q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def close(self, timeout: float = 5):
+        try:
+            self.q.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.proc.join(timeout)
+        if self.proc.is_alive():
+            self.proc.terminate()
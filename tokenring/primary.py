@@ -1,19 +1,24 @@
 #!/usr/bin/env python3
 """
 Primary-secondary polling topology
-  • Primary Pi polls two secondary Pis over TCP
-  • Each cycle:
-        sensor_readings1  ← primary’s own data
-        sensor_readings2  ← first secondary
-        sensor_readings3  ← second secondary
-  • Plots one PNG per round
+  • Primary Pi polls any number of secondary Pis over TCP, all at once
+  • Each cycle, rows of the readings table (storage.py):
+        node_id 1    ← primary’s own data
+        node_id 2    ← first secondary
+        node_id k    ← (k-1)-th secondary
+  • A round waits at most ROUND_DEADLINE s; whatever arrived by then is stored
+  • Plots one PNG per round (plot_engine: the figure is built once)
 Usage:
+    primary.py <host:port> [<host:port> ...]
     primary.py <sec1_host> <sec1_port> <sec2_host> <sec2_port>
+    primary.py --config secondaries.json      (JSON list of "host:port")
 """
 import json, sys, socket, time
+from concurrent.futures import ThreadPoolExecutor, wait
 import matplotlib.pyplot as plt
 import sensor_polling
-import mysql.connector           
+from plot_engine import PlotEngine, PALETTE, values_with_avg
+from db_writer import LapWriter, reading_row
 
 DB = dict(
     host     = "192.168.0.132",        # laptop IP
@@ -22,27 +27,58 @@ DB = dict(
     password = "theeIoTofGoats!",
     database = "piSenseDB"
 )
-conn = mysql.connector.connect(**DB)
-cur  = conn.cursor(prepared=True)     
-INSERT = ("INSERT INTO {table} "
-          "(temperature, humidity, wind_speed, soil_moisture, topology_state) "
-          "VALUES (%s, %s, %s, %s, %s)")
-
-REQUEST = b"Requesting Data"
-
-if len(sys.argv) != 5:
-    print(f"Usage: {sys.argv[0]} <sec1_host> <sec1_port> <sec2_host> <sec2_port>")
+REQUEST        = b"Requesting Data"
+ROUND_DEADLINE = 5        # s – a round never waits longer than this
+ROUND_PAUSE    = 3        # s between rounds
+MAX_REPLY      = 65536    # bytes we are willing to read from one secondary
+PLOT_TITLES    = ("Temperature", "Humidity", "Soil Moisture", "Wind Speed")
+PLOT_YLABELS   = ("°C", "%", "Units", "m/s")
+
+
+def parse_clients(argv):
+    """host:port list, legacy host port pairs, or --config <file.json>."""
+    if argv[:1] == ["--config"] and len(argv) == 2:
+        with open(argv[1]) as f:
+            argv = json.load(f)
+    clients, i = [], 0
+    while i < len(argv):
+        if ":" in argv[i]:
+            host, port = argv[i].rsplit(":", 1); i += 1
+        else:
+            host, port = argv[i], argv[i + 1]; i += 2
+        clients.append((host, int(port)))
+    return clients
+
+try:
+    clients = parse_clients(sys.argv[1:])                      # keep order!
+except (IndexError, ValueError, OSError) as e:
+    clients = []
+    print(f"[args] {e!r}")
+if not clients:
+    print(f"Usage: {sys.argv[0]} <host:port> [<host:port> ...] | --config secondaries.json")
     sys.exit(1)
 
-sec1_host, sec1_port = sys.argv[1], int(sys.argv[2])
-sec2_host, sec2_port = sys.argv[3], int(sys.argv[4])
-clients = [(sec1_host, sec1_port), (sec2_host, sec2_port)]   # keep order!
+writer = LapWriter(DB, spool_path="poll-spool.db").start()
+pool   = ThreadPoolExecutor(max_workers=len(clients) + 1, thread_name_prefix="poll")
+plots  = PlotEngine(plt, prefix="polling-plot", titles=PLOT_TITLES, ylabels=PLOT_YLABELS)
 
-def request_readings(host, port):
+def request_readings(host, port, deadline):
+    """One request/response; never runs past the round's deadline."""
     try:
-        with socket.create_connection((host, port), timeout=5) as sock:
+        budget = max(0.01, deadline - time.monotonic())
+        with socket.create_connection((host, port), timeout=budget) as sock:
             sock.sendall(REQUEST)
-            data = sock.recv(2048)
+            data = b""
+            while len(data) < MAX_REPLY:
+                sock.settimeout(max(0.01, deadline - time.monotonic()))
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+                try:
+                    return json.loads(data.decode())
+                except ValueError:
+                    continue            # reply not complete yet
         return json.loads(data.decode())
     except socket.timeout:
         print(f"[timeout] {host}:{port}")
@@ -50,82 +86,50 @@ def request_readings(host, port):
         print(f"[error] {host}:{port} → {e!r}")
     return None
 
-def db_insert(table, reading, topo_json):
-    if not reading:
-        return
-    vals = (
-        reading.get("temperature"),
-        reading.get("humidity"),
-        reading.get("wind_speed"),
-        reading.get("soil_moisture"),
-        reading.get("topology_state", topo_json), 
-    )
-    cur.execute(INSERT.format(table=table), vals)
-    conn.commit()
+def poll_secondaries():
+    """Query every secondary in parallel; None for any that missed the deadline."""
+    deadline = time.monotonic() + ROUND_DEADLINE
+    futs = [pool.submit(request_readings, host, port, deadline) for host, port in clients]
+    done, _ = wait(futs, timeout=max(0, deadline - time.monotonic()))
+    return [f.result() if f in done else None for f in futs]
 
 def plot_round(local, measurements, round_no):
-    metrics = ['temperature', 'humidity', 'soil_moisture', 'wind_speed']
-    titles  = ['Temperature', 'Humidity', 'Soil Moisture', 'Wind Speed']
-    ylabels = ['°C', '%', 'Units', 'm/s']
-
-    data_matrix = []
-    for m in metrics:
-        vals = [
-            measurements[0].get(m) if measurements[0] else None,
-            measurements[1].get(m) if measurements[1] else None,
-            local.get(m)
-        ]
-        avg = sum(v for v in vals if v is not None) / max(1, len([v for v in vals if v]))
-        vals.append(avg)
-        data_matrix.append(vals)
-
-    labels = ['Sec1', 'Sec2', 'Primary', 'Avg']
-    colors = ['red', 'blue', 'green', 'black']
-    fig, axes = plt.subplots(2, 2, figsize=(10, 8)); axes = axes.flatten()
-
-    for i, ax in enumerate(axes):
-        vals = data_matrix[i]
-        ax.set_xticks(range(4)); ax.set_xticklabels(labels)
-        ax.set_title(titles[i]); ax.set_ylabel(ylabels[i]); ax.grid(True, ls='--', alpha=.4)
-        for x, c, y in zip(range(4), colors, vals):
-            ax.scatter(x, y if y is not None else 0, color=c, marker='o' if y else 'x', s=80)
-
-    fig.tight_layout()
-    fname = f"polling-plot-{round_no}.png"
-    fig.savefig(fname); plt.close(fig)
+    labels = [f'Sec{i}' for i in range(1, len(measurements) + 1)] + ['Primary', 'Avg']
+    colors = [PALETTE[i % len(PALETTE)] for i in range(len(measurements))] + ['green', 'black']
+    fname  = plots.render(labels, colors, values_with_avg(measurements + [local]), round_no)
     print(f"[plot] saved {fname}")
 
 def main():
     round_no = 1
     while True:
         # ── poll sensors ────────────────────────────────────────────────
-        local = sensor_polling.get_local_measurements()   # primary
-        sec_readings = []                                 # list for Sec1, Sec2
-        for host, port in clients:
-            sec_readings.append(request_readings(host, port))
+        t0 = time.monotonic()
+        polling = pool.submit(poll_secondaries)           # secondaries, in parallel
+        local = sensor_polling.get_local_measurements()   # primary, meanwhile
+        sec_readings = polling.result()                   # Sec1 … SecN, None = missed
+        print(f"[round {round_no}] {sum(r is not None for r in sec_readings)}/{len(clients)} "
+              f"secondaries in {time.monotonic() - t0:.2f}s")
 
         # ── build a JSON list with the *currently alive* nodes in order ─
-        live_nodes = ["Primary"]
-        if sec_readings[0]: live_nodes.append("Sec1")
-        if sec_readings[1]: live_nodes.append("Sec2")
+        live_nodes = ["Primary"] + [f"Sec{i}" for i, r in enumerate(sec_readings, 1) if r]
         topo_json = json.dumps(live_nodes)
 
-        # ── store everything ------------------------------------------------
-        local["topology_state"] = topo_json
-        db_insert("sensor_readings1", local, topo_json)
-
-        for idx, reading in enumerate(sec_readings, start=2):   # idx 2,3
-            if reading is not None:
+        # ── store everything (one batch per round, written off-thread) ─────
+        rows = [(1, reading_row(local, topo_json))]
+        for idx, reading in enumerate(sec_readings, start=2):   # idx 2 … N+1
+            if reading:
                 reading["topology_state"] = topo_json
-            db_insert(f"sensor_readings{idx}", reading, topo_json)
+                rows.append((idx, reading_row(reading, topo_json)))
+        writer.submit(rows)
 
         # ── plot & wait -----------------------------------------------------
         plot_round(local, sec_readings, round_no)
         round_no += 1
-        time.sleep(3)
+        time.sleep(ROUND_PAUSE)
 
 if __name__ == "__main__":
     try:
         main()
     finally:
-        conn.close()
\ No newline at end of file
+        pool.shutdown(wait=False, cancel_futures=True)
+        writer.close()
\ No newline at end of file
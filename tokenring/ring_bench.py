@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+ring_bench.py  –  hardware-free token-ring simulation and benchmark
+  • runs N RingNodes on localhost inside one event loop (N = 3 … a few hundred)
+  • fake sensors (per-node random walk), spool-only SQLite store, no plots,
+    no MySQL – nothing here touches I2C or the network beyond 127.0.0.1
+  • kills random nodes during the run (and optionally rejoins them) and
+    reports laps/s, per-hop latency p50/p99, lap period, time to recover a
+    full lap after every fault, and bytes per token on the wire
+  • --ring-size k splits the nodes into local rings of k whose first nodes
+    (never killed) also form an upper ring carrying lap summaries
+Usage:
+    ring_bench.py [--nodes 10] [--duration 30] [--kills 2] [--rejoin] ...
+    ring_bench.py --help
+"""
+import argparse, asyncio, contextlib, json, os, random, sys, tempfile, time
+from db_writer import LapWriter
+from ring_node import RingNode
+
+
+class FakeSensors:
+    """Stands in for sensor_polling.get_latest_measurements on one node."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.state = dict(temperature=20.0, humidity=55.0, soil_moisture=400.0,
+                          soil_temperature=18.0, wind_speed=2.0)
+
+    def __call__(self):
+        for k, v in self.state.items():
+            self.state[k] = max(0.0, v + self.rng.gauss(0, 0.1))
+        return dict(self.state), 0.0
+
+
+class Recorder:
+    """Collects RingNode trace events; everything is timed on one clock."""
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, addr, event, fields):
+        self.events.append((fields.get("t", time.monotonic()), addr, event, fields))
+
+    def since(self, t0, event):
+        return [(t, a, f) for t, a, e, f in self.events if e == event and t >= t0]
+
+
+def pct(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def lap_periods(rec, t0, tokens):
+    """Time between successive laps of the same token slot at the same closer."""
+    last, periods = {}, []
+    for t, addr, f in rec.since(t0, "lap"):
+        key = (addr, (f["round"] - 1) % tokens)
+        if key in last:
+            periods.append(t - last[key])
+        last[key] = t
+    return periods
+
+
+def hop_latencies(rec, t0):
+    """Pair each send with the next matching recv at its target."""
+    pending = {}
+    for t, addr, f in rec.since(t0, "send"):
+        pending.setdefault((f["to"], f["round"], f["n"]), []).append(t)
+    hops = []
+    for t, addr, f in rec.since(t0, "recv"):
+        sent = pending.get((addr, f["round"], f["n"]))
+        if sent and sent[0] <= t:
+            hops.append(t - sent.pop(0))
+    return hops
+
+
+def duplicate_laps(laps, ring_of):
+    """Laps closed for a round that a lap of the same ring had already closed."""
+    seen, dups = set(), 0
+    for _, addr, f in laps:
+        key = (ring_of[addr], f["round"])
+        dups += key in seen
+        seen.add(key)
+    return dups
+
+
+class Bench:
+    def __init__(self, args):
+        self.args   = args
+        self.addrs  = [f"127.0.0.1:{args.base_port + i}" for i in range(args.nodes)]
+        size        = args.ring_size or args.nodes
+        self.groups = [list(range(g, min(g + size, args.nodes))) for g in range(0, args.nodes, size)]
+        self.group  = {i: g for g, members in enumerate(self.groups) for i in members}
+        self.leaders = [members[0] for members in self.groups]
+        self.upper  = ([f"127.0.0.1:{args.base_port + args.nodes + g}" for g in range(len(self.groups))]
+                       if args.ring_size else [])
+        self.rec    = Recorder()
+        self.urec   = Recorder()        # upper ring, reported apart
+        self.tasks  = {}
+        self.nodes  = {}
+        self.upper_tasks = []
+        self.faults = []            # (kind, addr, t, live nodes after the fault)
+        self.tmp    = tempfile.mkdtemp(prefix="ring-bench-")
+
+    def _node(self, i, role):
+        a = self.args
+        store = ":memory:" if a.store == "memory" else os.path.join(self.tmp, f"node{i}.db")
+        codecs = ("json",) if a.codec == "json" else ("bin1", "json")
+        ring = [self.addrs[j] for j in self.groups[self.group[i]]]
+        return RingNode(role, self.addrs[i], ring, FakeSensors(i), LapWriter(None, store),
+                        timeout=a.timeout, plot_pause=a.pause, retry_pause=a.pause or 0.05,
+                        codecs=codecs, trace=self.rec, tokens=a.tokens,
+                        aggregate=a.aggregate)
+
+    def start(self, i):
+        node = self._node(i, "start" if i in self.leaders else "mid")
+        self.nodes[i] = node
+        self.tasks[i] = asyncio.create_task(node.run())
+
+    async def kill(self, i):
+        task = self.tasks.pop(i)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        self.nodes.pop(i).writer.close()
+
+    async def run(self):
+        a = self.args
+        for i in range(a.nodes):
+            if i not in self.leaders:
+                self.start(i)
+        await asyncio.sleep(0.2 + 0.002 * a.nodes)          # let every server bind
+        for i in self.leaders:
+            self.start(i)
+        for g, addr in enumerate(self.upper):
+            node = RingNode("start" if g == 0 else "mid", addr, self.upper,
+                            self.nodes[self.leaders[g]].lap_summary, None,
+                            timeout=a.timeout, plot_pause=a.pause, retry_pause=a.pause or 0.05,
+                            trace=self.urec)
+            self.upper_tasks.append(asyncio.create_task(node.run()))
+        await asyncio.sleep(0.05)
+        failed = [self.addrs[i] for i, t in self.tasks.items() if t.done()]
+        failed += [self.upper[g] for g, t in enumerate(self.upper_tasks) if t.done()]
+        if failed:
+            await self.stop()
+            raise SystemExit(f"nodes failed to start (port in use?): {', '.join(failed)}")
+
+        t_begin = time.monotonic()
+        await asyncio.sleep(a.warmup)
+        t_measure = time.monotonic()
+
+        span = a.duration - a.warmup
+        rng  = random.Random(a.seed)
+        for k in range(a.kills):
+            # faults evenly spaced over the measured part of the run
+            await asyncio.sleep(max(0.0, t_measure + span * (k + 1) / (a.kills + 1) - time.monotonic()))
+            live = [i for i in self.tasks if i not in self.leaders]
+            if not live:
+                break
+            victim = rng.choice(live)
+            await self.kill(victim)
+            self.faults.append(("kill", victim, time.monotonic(), self.alive_in(victim)))
+            if a.rejoin:
+                await asyncio.sleep(a.down)
+                self.start(victim)
+                self.faults.append(("rejoin", victim, time.monotonic(), self.alive_in(victim)))
+
+        await asyncio.sleep(max(0.0, t_begin + a.duration - time.monotonic()))
+        t_end = time.monotonic()
+        await self.stop()
+        return self.report(t_measure, t_end)
+
+    def alive_in(self, i):
+        """Live members of node i's local ring."""
+        return sum(j in self.tasks for j in self.groups[self.group[i]])
+
+    async def stop(self):
+        for t in self.upper_tasks:
+            t.cancel()
+        await asyncio.gather(*self.upper_tasks, return_exceptions=True)
+        for i in list(self.tasks):
+            await self.kill(i)
+
+    def report(self, t0, t1):
+        laps  = [(t, a, f) for t, a, f in self.rec.since(t0, "lap") if t <= t1]
+        hops  = hop_latencies(self.rec, t0)
+        sizes = [f["nbytes"] for _, _, f in self.rec.since(t0, "send")]
+        recov = []
+        ring_of = {self.addrs[i]: self.group[i] for i in self.group}
+        for kind, i, t, live in self.faults:
+            full = next((lt for lt, a, f in laps
+                         if lt > t and ring_of[a] == self.group[i] and f["n"] >= live), None)
+            recov.append(dict(kind=kind, node=self.addrs[i], seconds=None if full is None else full - t))
+        periods = lap_periods(self.rec, t0, self.args.tokens)
+        upper   = [t for t, _, _ in self.urec.since(t0, "lap") if t <= t1]
+        uperiod = lap_periods(self.urec, t0, 1)
+        ms = lambda v: None if v is None else round(v * 1000, 3)
+        return dict(
+            nodes=self.args.nodes, codec=self.args.codec, tokens=self.args.tokens,
+            rings=len(self.groups), seconds=round(t1 - t0, 2),
+            laps=len(laps), laps_per_s=round(len(laps) / (t1 - t0), 3),
+            readings_per_s=round(sum(f["n"] for _, _, f in laps) / (t1 - t0), 1),
+            lap_ms_p50=ms(pct(periods, 0.50)), lap_ms_p99=ms(pct(periods, 0.99)),
+            upper_laps=len(upper), upper_lap_ms_p50=ms(pct(uperiod, 0.50)),
+            hop_ms_p50=ms(pct(hops, 0.50)), hop_ms_p99=ms(pct(hops, 0.99)), hops=len(hops),
+            token_bytes_mean=round(sum(sizes) / len(sizes), 1) if sizes else None,
+            token_bytes_p99=pct(sizes, 0.99), token_bytes_max=max(sizes) if sizes else None,
+            regens=len(self.rec.since(t0, "regen")),
+            duplicate_laps=duplicate_laps(laps, ring_of),
+            recovery=recov,
+        )
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the token ring on localhost, no hardware.")
+    p.add_argument("--nodes", type=int, default=10)
+    p.add_argument("--duration", type=float, default=30, help="total run time, s")
+    p.add_argument("--warmup", type=float, default=5, help="s before measuring")
+    p.add_argument("--kills", type=int, default=0, help="nodes killed during the run")
+    p.add_argument("--rejoin", action="store_true", help="restart each killed node")
+    p.add_argument("--down", type=float, default=2, help="s a killed node stays down")
+    p.add_argument("--ring-size", type=int, default=0,
+                   help="nodes per local ring (0: one flat ring)")
+    p.add_argument("--tokens", type=int, default=1, help="tokens in flight (pipelined ring)")
+    p.add_argument("--aggregate", action="store_true", help="in-token aggregates mode")
+    p.add_argument("--codec", choices=("bin1", "json"), default="bin1")
+    p.add_argument("--pause", type=float, default=0.0, help="PLOT_PAUSE for every node")
+    p.add_argument("--timeout", type=float, default=2.0, help="initial TIMEOUT per node")
+    p.add_argument("--store", choices=("memory", "sqlite"), default="memory")
+    p.add_argument("--base-port", type=int, default=47000)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    return p.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        report = asyncio.run(Bench(args).run())
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"nodes={report['nodes']} rings={report['rings']} codec={report['codec']} "
+          f"tokens={report['tokens']} measured {report['seconds']}s")
+    print(f"  laps            {report['laps']}  ({report['laps_per_s']} laps/s, "
+          f"{report['readings_per_s']} readings/s)")
+    print(f"  lap period      p50 {report['lap_ms_p50']} ms   p99 {report['lap_ms_p99']} ms")
+    if report["rings"] > 1:
+        print(f"  upper ring      {report['upper_laps']} laps   p50 {report['upper_lap_ms_p50']} ms")
+    print(f"  hop latency     p50 {report['hop_ms_p50']} ms   p99 {report['hop_ms_p99']} ms"
+          f"   ({report['hops']} hops)")
+    print(f"  token size      mean {report['token_bytes_mean']} B   p99 {report['token_bytes_p99']} B"
+          f"   max {report['token_bytes_max']} B")
+    print(f"  re-initiations  {report['regens']}   duplicate laps {report['duplicate_laps']}")
+    for r in report["recovery"]:
+        took = "never" if r["seconds"] is None else f"{r['seconds']:.3f}s"
+        print(f"  {r['kind']:<6} {r['node']}  full lap after {took}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""
+ring_node.py  –  asyncio runtime behind token-ring.py
+One event loop per node runs three tasks side by side:
+  • server   – accepts predecessor connections, queues every framed token
+  • persist  – hands finished laps to the background LapWriter
+  • ring     – the token loop (receive → append reading → forward / close lap)
+Sensor values come from sensor_polling's background Sampler; the token path
+only picks up its latest sample and never touches the I2C bus.
+With tokens=K > 1 the ring is pipelined: K tokens circulate at once.  A
+token's round is its sequence number and token k carries rounds k+1,
+k+1+K, k+1+2K, ... so each of the K "slots" is tracked on its own: a
+duplicate or stale round is dropped, a slot that goes quiet is re-initiated
+alone, and laps may close in any order.  Every round has one owner: a token
+carries the `origin` that started it, and when two nodes re-initiated the
+same slot at the same round, the lower origin wins everywhere the two
+copies meet and the other copy is dropped, so the slot goes back to one token.  Every node samples once per token
+that passes, so readings per second grow with K.
+Membership: every token carries this node's versioned view of the ring
+(membership.py) and every receiver merges it, so a node found dead or
+rejoining is known ring-wide within a lap.
+Aggregate mode (aggregate=True): the token carries each node's latest
+reading plus running count / sum / min / max of every metric ("agg"),
+instead of being the only copy of every reading.  Each node spools its own
+raw readings and its LapWriter ships them in bulk, so the lap closer stores
+nothing and per-hop work does not depend on how much was sampled.
+Hierarchy: the node that closes a lap puts a summary of it (count and mean
+of every metric) on the next round's token, so every member learns the last
+lap's result one hop later.  An aggregator runs a second RingNode in an
+upper ring whose `sample` is lap_summary() – small local rings, one upper
+ring of their aggregators, and lap time and failover grow with the ring
+sizes rather than with the whole fleet.  A summary carries its reading
+count and summaries are averaged weighted by it, so an aggregator of the
+upper ring can run a node in a ring above that, and so on.
+Lap plots are handed to a plot_worker.PlotWorker process.  Every stage of
+the token path is timed into a metrics.Metrics (served by metrics.serve).  Nothing on the
+token path blocks the loop, so a rejoin probe or a second token is accepted
+while the node is sampling, writing or plotting.
+"""
+import asyncio, json, time
+import token_codec
+from failure_detector import AdaptiveTimeout
+from membership import Membership
+from metrics import Metrics
+from db_writer import reading_row
+from ring_transport import SuccessorLink, FrameError, read_frame, write_frame, probe, wait_within
+
+TIMEOUT       = 10
+PLOT_PAUSE    = 3
+RETRY_PAUSE   = 2
+STALE_AFTER   = 30      # s – warn when the freshest sensor sample is older
+
+# adaptive deadlines (see failure_detector): floors and ceilings in seconds
+RECV_FLOOR    = 1.0
+RECV_CEILING  = 120
+CONNECT_FLOOR = 1.5     # above one SYN retransmit (1 s initial RTO), so one lost SYN is not a death
+RECV_STAGGER  = 0.25    # extra share of the learned receive deadline per ring position
+PROBE_FANOUT  = 4       # successors probed at once when the next one is down
+
+
+def summarize(data: list[dict], agg: dict | None = None) -> dict:
+    """
+    One lap as a single reading: how many readings, and each metric's mean
+    (rounded – it rides on the next token as JSON, and readings are float32).
+    A reading that is itself a summary (an upper ring's) counts as its "n".
+    """
+    if agg is not None:
+        n    = max((a[0] for a in agg.values()), default=0)
+        mean = {k: agg[k][1] / agg[k][0] if k in agg else None for k in token_codec.FIELDS}
+    else:
+        n, mean = sum(rec.get("n", 1) for rec in data), {}
+        for k in token_codec.FIELDS:
+            vals = [(rec[k], rec.get("n", 1)) for rec in data if rec.get(k) is not None]
+            weight = sum(w for _, w in vals)
+            mean[k] = sum(v * w for v, w in vals) / weight if weight else None
+    return {"n": n, **{k: None if v is None else round(v, 3) for k, v in mean.items()}}
+
+
+def outranks(a: tuple, b: tuple) -> bool:
+    """
+    Whether token a = (round, origin) beats b in their slot: the later round,
+    and of two copies of one round the lower origin address, so every node
+    picks the same survivor.
+    """
+    return a[0] > b[0] or (a[0] == b[0] and a[1] < b[1])
+
+
+def fold(agg: dict, reading: dict):
+    """Add one reading to a token's running [count, sum, min, max] per metric."""
+    for k in token_codec.FIELDS:
+        v = reading.get(k)
+        if v is None:
+            continue
+        a = agg.get(k)
+        if a is None:
+            agg[k] = [1, v, v, v]
+        else:
+            a[0] += 1; a[1] += v; a[2] = min(a[2], v); a[3] = max(a[3], v)
+
+
+class RingNode:
+    """
+    One token-ring member.  `sample` is a non-blocking callable returning
+    (reading dict, age in s or None if it has none) –
+    sensor_polling.get_latest_measurements, or lap_summary() of a lower ring.
+    `writer` is a started db_writer.LapWriter (None: laps are not stored,
+    as in an upper ring of summaries) and
+    `plot` a non-blocking plot(data, round_num) callable (PlotWorker) or None.
+    `codecs` are the token encodings offered to successors (token_codec).
+    `trace`, if given, is called as trace(my_addr, event, fields) at the
+    recv / send / lap / regen / topology points (used by ring_bench).
+    `metrics` collects per-stage timings and counters; one is created if
+    none is given.  `tokens` is the number of tokens kept in flight; every
+    node of a ring must use the same value, and the same `aggregate`.
+    """
+
+    def __init__(self, role, my_addr, ring, sample, writer,
+                 timeout=TIMEOUT, plot_pause=PLOT_PAUSE, retry_pause=RETRY_PAUSE,
+                 stale_after=STALE_AFTER, plot=None, codecs=token_codec.CODECS,
+                 trace=None, metrics=None, tokens=1, aggregate=False):
+        self.role, self.my_addr = role, my_addr
+        self.view        = Membership(my_addr, ring)
+        self.ring        = self.view.ring()      # live members, in ring order
+        self.sample      = sample
+        self.writer      = writer
+        self.timeout     = timeout
+        self.plot_pause  = plot_pause
+        self.retry_pause = retry_pause
+        self.stale_after = stale_after
+        self.plot        = plot
+        self.trace       = trace
+        self.metrics     = metrics if metrics is not None else Metrics(my_addr)
+        self.closing     = False
+        # lap gaps seen here drive the receive deadline; connect and probe
+        # times the connect deadline; both start out at the old fixed values
+        self.lap_fd      = AdaptiveTimeout(timeout, RECV_FLOOR, RECV_CEILING)
+        self.connect_fd  = AdaptiveTimeout(timeout, CONNECT_FLOOR, timeout, factor=3.0)
+        self.link        = SuccessorLink(timeout, codecs, detector=self.connect_fd)
+        self.tokens      = tokens
+        self.aggregate   = aggregate
+        self.newest      = {}              # slot → (round, origin) of the winning token seen or started
+        self.joined      = {}              # slot → (round, origin, readings) this node last left on it
+        self.slot_seen   = {}              # slot → monotonic time of its last token
+        self.unclocked   = set()           # slots whose next gap spans an outage
+        self.plotted     = 0
+        self.round_num   = 1               # highest round seen
+        self.pending     = set()           # next-round launches waiting out plot_pause
+        self.forwarding  = asyncio.Lock()  # one forward (and its topology updates) at a time
+        self.last_lap    = None            # summary of the newest lap seen
+        self._reindex()
+
+    # ── topology ───────────────────────────────────────────────────────────
+    @property
+    def N(self):
+        return len(self.ring)
+
+    def _reindex(self):
+        self.my_index   = self.ring.index(self.my_addr)
+        self.pred_index = (self.my_index - 1) % self.N
+
+    def update_topology_and_indices(self, node_addr):
+        """
+        If node_addr is already in ring, remove it (because unreachable).
+        Otherwise, bring it back (because rejoining).  Then recalc my_index etc.
+        """
+        if node_addr in self.ring:
+            self.remove_nodes([node_addr])
+        elif self.view.revive(node_addr):
+            self._apply_view()
+
+    def remove_nodes(self, dead):
+        """Drop every confirmed-dead node in one topology update."""
+        if self.view.mark_dead(dead):
+            self._apply_view()
+
+    def _apply_view(self):
+        ring = self.view.ring()
+        if ring == self.ring:
+            return
+        gone  = [a for a in self.ring if a not in ring]
+        added = [a for a in ring if a not in self.ring]
+        if gone:
+            self.metrics.inc("nodes_removed", len(gone))
+            print(f"[{self.role}] Removing node(s) {', '.join(gone)} from ring.")
+        if added:
+            self.metrics.inc("nodes_added", len(added))
+            print(f"[{self.role}] Adding node(s) {', '.join(added)} back into ring.")
+            # laps get longer: gaps learned on the smaller ring would time out
+            # too early (a shrinking ring only makes the old deadline generous)
+            self.lap_fd.reset()
+        self.ring = ring
+        self._topology_changed()
+
+    def _emit(self, event, **fields):
+        if self.trace is not None:
+            self.trace(self.my_addr, event, fields)
+
+    def _topology_changed(self):
+        self._reindex()
+        self.metrics.inc("topology_changes")
+        self._emit("topology", ring=list(self.ring), epoch=self.view.epoch)
+        print(f"[{self.role}] Updated ring={self.ring} (epoch {self.view.epoch}), N={self.N}, "
+              f"my_index={self.my_index}, predecessor={self.ring[self.pred_index]}")
+
+    def attach_topology(self, reading: dict) -> dict:
+        """Adds 'node' and 'topology_state' (JSON of the CURRENT ring order)."""
+        reading = dict(reading)
+        reading["node"] = self.my_index
+        reading["topology_state"] = json.dumps(self.ring)
+        return reading
+
+    def slot(self, round_num) -> int:
+        return (round_num - 1) % self.tokens
+
+    def new_token(self, round_num, data):
+        token = {
+            "source": self.my_addr,
+            "data":   data,
+            "round":  round_num,
+            "origin": self.my_addr,
+            "closed": False
+        }
+        if self.aggregate:
+            token["agg"] = {}
+        return token
+
+    def contribute(self, token):
+        """Add this node's reading to the token."""
+        rec = self.reading()
+        if not self.aggregate:
+            token["data"].append(rec)
+            return
+        fold(token.setdefault("agg", {}), rec)
+        self.laps.put_nowait([rec])            # raw row stays here, shipped by our writer
+        token["data"].append({k: v for k, v in rec.items() if k != "topology_state"})
+
+    def _keep(self, data):
+        """Store readings of a lap that ends here (aggregate mode stored them already)."""
+        if not self.aggregate:
+            self.laps.put_nowait(data)
+
+    # ── tasks ──────────────────────────────────────────────────────────────
+    async def run(self):
+        host, port = self.my_addr.split(":")
+        self.inbox = asyncio.Queue()
+        self.laps  = asyncio.Queue()
+        self.conns = set()
+        self.server = await asyncio.start_server(self._serve_conn, host, int(port),
+                                                 reuse_address=True)
+        print(f"[{self.role}] bound to {self.my_addr}, "
+              f"predecessor={self.ring[self.pred_index]}, ring={self.ring}")
+        helpers = [asyncio.create_task(self._persister())]
+        now = time.monotonic()
+        self.slot_seen = dict.fromkeys(range(self.tokens), now)
+        try:
+            await self._ring_loop()
+        finally:
+            self.closing = True
+            for t in helpers + list(self.pending):
+                t.cancel()
+            self.server.close()
+            for w in list(self.conns):
+                w.close()
+            self.link.close()
+            # flush laps that were queued but not yet handed to the writer
+            while not self.laps.empty():
+                self._submit(self.laps.get_nowait())
+
+    async def _serve_conn(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        if self.closing:                       # accepted while shutting down
+            writer.close()
+            return
+        self.conns.add(writer)
+        try:
+            while (payload := await read_frame(reader)) is not None:
+                if token_codec.is_hello(payload):
+                    await write_frame(writer, token_codec.answer(payload))
+                    continue
+                await self.inbox.put((payload, addr, time.monotonic()))
+        except (OSError, FrameError) as e:
+            print(f"[!] dropping connection from {addr}: {e!r}")
+        finally:
+            self.conns.discard(writer)
+            writer.close()
+
+    def reading(self) -> dict:
+        with self.metrics.time("sensor_read"):
+            raw, age = self.sample()
+        if age is not None and age > self.stale_after:
+            print(f"[{self.role}] sensor sample is {age:.0f}s old")
+        return self.attach_topology(raw)
+
+    def lap_summary(self):
+        """
+        `sample` for an upper-ring node: the newest lap summary ({"n": 0} before
+        the first lap closes).  Its age is None: it is not a sensor sample, so
+        the staleness warning does not apply.
+        """
+        if self.last_lap is None:
+            return {"n": 0}, None
+        return {k: v for k, v in self.last_lap.items() if k != "round"}, None
+
+    def _lap_done(self, summary):
+        if self.last_lap is None or summary.get("round", 0) > self.last_lap.get("round", 0):
+            self.last_lap = summary
+
+    def _submit(self, records):
+        if self.writer is None:
+            return
+        topo_json = json.dumps(self.ring)
+        with self.metrics.time("db_insert"):
+            self.writer.submit([(rec["node"] + 1, reading_row(rec, topo_json))
+                                for rec in records if rec])
+
+    async def _persister(self):
+        while True:
+            records = list(await self.laps.get())
+            while not self.laps.empty():       # whatever queued meanwhile goes in one write
+                records += self.laps.get_nowait()
+            # submit() is a local spool write, kept off the loop all the same
+            await asyncio.to_thread(self._submit, records)
+
+    # ── token path ─────────────────────────────────────────────────────────
+    def recv_deadline(self) -> float:
+        """
+        How long to wait for the token before re-initiating it.  Until enough
+        laps were seen this is the old TIMEOUT * (my_index + 1); afterwards it
+        is the learned lap deadline plus RECV_STAGGER of it per ring position.
+        The stagger scales with the deadline, not with the lap time (which
+        may be milliseconds under a 1 s floor), so the first live node
+        really does re-initiate first and the others see its token in time.
+        """
+        if not self.lap_fd.ready:
+            return self.timeout * (self.my_index + 1)
+        return min(RECV_CEILING, self.lap_fd.timeout() * (1 + RECV_STAGGER * self.my_index))
+
+    def _expired(self, now) -> list[int]:
+        """Slots that have been quiet for longer than the receive deadline."""
+        deadline = self.recv_deadline()
+        return [k for k, seen in self.slot_seen.items() if now - seen >= deadline]
+
+    async def recv_token(self):
+        """
+        Wait for a token to arrive (or until a slot's deadline passes).
+        Inspect token["source"] to detect re-joins.  Returns None on timeout,
+        {} for a token that is invalid, a duplicate, or stale.
+        """
+        waiting = time.monotonic()
+        wait = min(self.slot_seen.values()) + self.recv_deadline() - waiting
+        try:
+            raw, addr, arrived = await wait_within(self.inbox.get(), max(0.0, wait))
+        except asyncio.TimeoutError:
+            self.metrics.inc("timeouts")
+            return None
+        # a token that was already queued waited on us, not we on it
+        self.metrics.observe("accept_wait", max(0.0, arrived - waiting))
+
+        try:
+            with self.metrics.time("decode"):
+                token = token_codec.decode(raw)
+        except Exception as e:
+            self.metrics.inc("tokens_invalid")
+            print(f"[!] invalid token from {addr}: {e!r}")
+            return {}
+        self.metrics.inc("tokens_received")
+        self._emit("recv", t=arrived, round=token.get("round"),
+                   n=len(token.get("data") or []), nbytes=len(raw))
+        # views only ever move forward, so even a stale token's view is worth merging
+        if self.view.merge(token.pop("view", None)):
+            self._apply_view()
+        source_addr = token.get("source")
+        if source_addr and source_addr != self.my_addr and source_addr not in self.ring:
+            print(f"[{self.role}] Detected rejoining node {source_addr} from token")
+            self.update_topology_and_indices(source_addr)
+        if token.get("join"):
+            return {}                          # an announcement, not a lap
+
+        round_num = token.get("round", 0)
+        mark = (round_num, token.get("origin") or "")
+        k = self.slot(round_num)
+        joined = self.joined.get(k, (0, "", 0))
+        if joined[:2] == mark and len(token.get("data") or []) < joined[2]:
+            # a re-sent copy of a token we already handled (a token that came
+            # all the way back carries at least the readings we left on it)
+            self.metrics.inc("tokens_duplicate")
+            print(f"[{self.role}] dropping duplicate of round {round_num}")
+            return {}
+        newest = self.newest.get(k, (0, ""))
+        if outranks(newest, mark):
+            # overtaken by a re-initiated token of the same slot, or the losing
+            # copy of a round two nodes re-initiated at once; keep what it carried
+            self.metrics.inc("tokens_stale")
+            print(f"[{self.role}] dropping stale round {round_num} from {mark[1]} "
+                  f"(slot {k} is at {newest[0]} from {newest[1]}), keeping its readings")
+            if token.get("data"):
+                self._keep(token["data"])
+            return {}
+        self.newest[k] = mark
+        self.round_num = max(self.round_num, round_num)
+        if token.get("lap"):
+            self._lap_done(token["lap"])
+
+        # one lap of this slot between arrivals; skip gaps spanning an outage
+        if k not in self.unclocked:
+            self.lap_fd.observe(arrived - self.slot_seen[k])
+        self.unclocked.discard(k)
+        self.slot_seen[k] = arrived
+        return token
+
+    async def _send(self, addr, token):
+        token["view"] = self.view.payload()
+        t0 = time.monotonic()
+        nbytes = await self.link.send(addr, token)
+        self.metrics.inc("tokens_forwarded")
+        self.metrics.inc("bytes_sent", nbytes)
+        self._emit("send", t=t0, to=addr, round=token.get("round"),
+                   n=len(token.get("data") or []), nbytes=nbytes)
+        print(f"[{self.role}] forwarded to {addr}")
+
+    async def forward_token(self, token) -> bool:
+        """
+        Forward 'token' to the next live successor in the current ring.
+        If the direct successor is unreachable, the next PROBE_FANOUT
+        successors are probed at the same time; the first live one in ring
+        order gets the token and every dead one before it is dropped in a
+        single topology update, so k dead nodes cost one timeout, not k.
+        Return True if forwarded; False if ring is empty or no one accepted.
+        With tokens > 1, launches and the ring loop forward concurrently;
+        they take turns, so one of them probes and updates the ring.
+        """
+        async with self.forwarding:
+            with self.metrics.time("forward"):
+                ok = await self._forward(token)
+        if not ok:
+            self.metrics.inc("forward_failures")
+        return ok
+
+    async def _forward(self, token) -> bool:
+        if self.N - 1 == 0:
+            print(f"[{self.role}] No successors left. I must be last-alive.")
+            return False
+
+        successor = self.ring[(self.my_index + 1) % self.N]
+        try:
+            await self._send(successor, token)
+            return True
+        except OSError as e:
+            print(f"[!] successor {successor} unreachable: {e!r}, probing further successors")
+        dead = [successor]
+
+        while True:
+            following = [self.ring[(self.my_index + k) % self.N] for k in range(1, self.N)]
+            following = [a for a in following if a not in dead][:PROBE_FANOUT]
+            if not following:
+                break
+            timeout = self.link.connect_timeout()
+            took = await asyncio.gather(*(probe(a, timeout) for a in following))
+            for addr, seconds in zip(following, took):
+                if seconds is None:
+                    dead.append(addr)
+                    continue
+                self.connect_fd.observe(seconds)
+                self.remove_nodes(dead)
+                dead = []
+                try:
+                    await self._send(addr, token)
+                    return True
+                except OSError as e:
+                    print(f"[!] successor {addr} unreachable: {e!r}")
+                    dead.append(addr)
+                    break
+
+        self.remove_nodes(dead)
+        print(f"[ERROR] all successors unreachable from {self.my_addr} (after updating topology).")
+        return False
+
+    def _started(self, round_num):
+        k, mark = self.slot(round_num), (round_num, self.my_addr)
+        if outranks(mark, self.newest.get(k, (0, ""))):
+            self.newest[k] = mark
+        self.round_num = max(self.round_num, round_num)
+
+    async def close_lap(self, token, why):
+        """Persist + plot the finished lap, then start its slot's next round."""
+        round_num = token["round"]
+        self._emit("lap", t=time.monotonic(), round=round_num, n=len(token["data"]))
+        self.metrics.inc("laps")
+        self._keep(token["data"])
+        if self.plot is not None and round_num > self.plotted:
+            # laps of different slots may close out of order; never plot backwards
+            self.plotted = round_num
+            with self.metrics.time("plot"):
+                self.plot(token["data"], round_num)
+
+        summary = dict(summarize(token["data"], token.get("agg")), round=round_num)
+        self._lap_done(summary)
+
+        next_round = round_num + self.tokens
+        print(f"[{self.role}] {why} (size={self.N}). Starting empty token for round={next_round}")
+        self._started(next_round)
+        # the pause holds back only this slot; other tokens keep passing through
+        task = asyncio.create_task(self._launch(next_round, summary))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _launch(self, round_num, summary):
+        await asyncio.sleep(self.plot_pause)
+        token = self.new_token(round_num, [])
+        token["lap"] = summary                 # the rest of the ring learns the result
+        await self.forward_token(token)
+
+    async def _reinitiate(self, k):
+        """Start a fresh round for a slot that went quiet, ahead of any lost one."""
+        round_num = self.newest.get(k, (k + 1 - self.tokens,))[0] + self.tokens
+        print(f"[{self.role}] no token for slot {k} — re-initiating it as round {round_num}")
+        self._emit("regen", t=time.monotonic(), round=round_num)
+        self._started(round_num)
+        self.joined[k] = (round_num, self.my_addr, 1)
+        self.slot_seen[k] = time.monotonic()
+        self.unclocked.add(k)
+        token = self.new_token(round_num, [])
+        self.contribute(token)
+        if not await self.forward_token(token):
+            self._keep(token["data"])                # alone: keep our own readings
+
+    async def _announce(self):
+        """
+        Tell our successor we are here.  It puts us back into its view, and
+        the next token through it tells the rest of the ring, so a restarted
+        node is back within a lap instead of after its own receive deadline.
+        Best effort: an unreachable successor is not marked dead for it.
+        """
+        if self.N < 2:
+            return
+        successor = self.ring[(self.my_index + 1) % self.N]
+        token = self.new_token(0, [])
+        token["join"] = True
+        try:
+            await self._send(successor, token)
+        except OSError:
+            pass
+
+    async def _ring_loop(self):
+        if self.role != "start":
+            await self._announce()
+        if self.role == "start":
+            for k in range(self.tokens):
+                token = self.new_token(k + 1, [])
+                self.contribute(token)
+                self._started(k + 1)
+                self.joined[k] = (k + 1, self.my_addr, 1)
+                print(f"[start] initial token = {token}")
+                await self.forward_token(token)
+
+        while True:
+            token = await self.recv_token()
+
+            if token is None:
+                for k in self._expired(time.monotonic()):
+                    await self._reinitiate(k)
+                await asyncio.sleep(self.retry_pause)
+                continue
+            if not token:
+                continue
+
+            await self.handle_token(token)
+
+    async def handle_token(self, token):
+        """A token recv_token() accepted: close its lap here or pass it on."""
+        print(f"[{self.role}] got token: {token}")
+        k, mark = self.slot(token["round"]), (token["round"], token.get("origin") or "")
+        if self.joined.get(k, (0, "", 0))[:2] == mark:
+            # back here although our ring view expected more readings:
+            # every live node has had it, so this lap is done
+            await self.close_lap(token, "token came back around")
+            return
+        self.contribute(token)
+        self.joined[k] = (*mark, len(token["data"]))
+
+        if len(token["data"]) >= self.N:
+            await self.close_lap(token, "completed lap")
+            return
+
+        # Otherwise, not end of lap—forward normally (with updated ring)
+        token["source"] = self.my_addr
+        if not await self.forward_token(token):
+            await self.close_lap(token, "last-alive fallback")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+ring_transport.py  –  framed token transport for token-ring.py
+  • every token travels as  [4-byte big-endian length][payload]
+  • read_frame() keeps reading until the whole payload is in, so tokens
+    can be any size (up to MAX_FRAME); write_frame() is its sending side
+  • SuccessorLink keeps one long-lived connection to the current successor
+    and only reconnects when the successor changes or the connection dies;
+    each new connection starts with a codec HELLO (see token_codec)
+"""
+import asyncio, socket, struct, time
+import token_codec
+
+HEADER    = struct.Struct("!I")
+MAX_FRAME = 64 * 1024 * 1024          # refuse anything bigger than 64 MiB
+
+
+class FrameError(Exception):
+    pass
+
+
+async def read_frame(reader) -> bytes | None:
+    """One whole frame; None on a clean close between frames."""
+    try:
+        head = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise FrameError("peer closed mid-header") from None
+        return None
+    (size,) = HEADER.unpack(head)
+    if size > MAX_FRAME:
+        raise FrameError(f"frame of {size} bytes exceeds MAX_FRAME")
+    try:
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError as e:
+        raise FrameError(f"peer closed mid-frame ({len(e.partial)}/{size} bytes)") from None
+
+
+async def write_frame(writer, payload: bytes):
+    writer.write(HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+async def wait_within(aw, timeout: float):
+    """
+    asyncio.wait_for() that never swallows a cancel.  On 3.11 wait_for()
+    returns the result when a cancel races with completion, which leaves a
+    stopped node running; here the cancel always wins.  Raises
+    asyncio.TimeoutError (and cancels `aw`) when the timeout expires.
+    """
+    task = asyncio.ensure_future(aw)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if not done:
+        task.cancel()
+        raise asyncio.TimeoutError
+    return task.result()
+
+
+async def probe(addr: str, timeout: float) -> float | None:
+    """Seconds it took something at addr to accept a TCP connection; None if nothing did in time."""
+    host, port = addr.split(":")
+    t0 = time.monotonic()
+    try:
+        _, writer = await wait_within(asyncio.open_connection(host, int(port)), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    writer.close()
+    return time.monotonic() - t0
+
+
+class SuccessorLink:
+    """
+    Long-lived connection to whichever node is currently our successor.
+    send() reconnects transparently when the target changes or the old
+    connection turns out to be dead; connect failures propagate (OSError).
+    `codecs` is what we offer the successor, in order of preference.
+    Concurrent send() calls (a pipelined ring) are serialized: they would
+    otherwise each reconnect and leak all but the last connection.
+    An optional `detector` (failure_detector.AdaptiveTimeout) learns connect
+    times – real network round trips; a send only copies into the local
+    socket buffer – and replaces the fixed `timeout` once it has enough
+    samples.  The same deadline bounds the wait for the HELLO reply.
+    """
+
+    def __init__(self, timeout: float, codecs=token_codec.CODECS, detector=None):
+        self.timeout = timeout
+        self.codecs  = tuple(codecs)
+        self.detector = detector
+        self.addr    = None
+        self.reader  = None
+        self.writer  = None
+        self.codec   = "json"
+        self.lock    = asyncio.Lock()
+
+    def _alive(self) -> bool:
+        # After the HELLO reply nothing comes back on this link, so EOF
+        # means the peer is gone.
+        return not (self.reader.at_eof() or self.writer.is_closing())
+
+    def connect_timeout(self) -> float:
+        return self.detector.timeout() if self.detector else self.timeout
+
+    async def _negotiate(self, addr):
+        self.codec = "json"
+        if self.codecs == ("json",):
+            return
+        await write_frame(self.writer, token_codec.offer(self.codecs))
+        try:
+            reply = await wait_within(read_frame(self.reader), self.connect_timeout())
+        except asyncio.TimeoutError:
+            # a pre-HELLO peer, or a slow one: JSON works with both
+            print(f"[!] no codec reply from {addr} within {self.connect_timeout():.2f}s, sending JSON")
+            reply = None
+        if reply is None:
+            return
+        if reply.decode() in self.codecs:
+            self.codec = reply.decode()
+
+    async def _connect(self, addr: str):
+        self.close()
+        host, port = addr.split(":")
+        timeout = self.connect_timeout()
+        t0 = time.monotonic()
+        try:
+            self.reader, self.writer = await wait_within(
+                asyncio.open_connection(host, int(port)), timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout(f"connect to {addr} timed out after {timeout:.2f}s") from None
+        if self.detector:
+            self.detector.observe(time.monotonic() - t0)
+        try:
+            await self._negotiate(addr)
+        except (OSError, FrameError):
+            self.close()
+            raise ConnectionResetError(f"{addr} dropped the codec handshake") from None
+        self.addr = addr
+
+    async def send(self, addr: str, token: dict) -> int:
+        """Encode `token` with the negotiated codec and send it; returns bytes sent."""
+        async with self.lock:
+            return await self._send(addr, token)
+
+    async def _send(self, addr: str, token: dict) -> int:
+        fresh = False
+        if addr != self.addr or self.writer is None or not self._alive():
+            await self._connect(addr)
+            fresh = True
+        try:
+            payload = token_codec.encode(token, self.codec)
+            await write_frame(self.writer, payload)
+        except OSError:
+            self.close()
+            if fresh:
+                raise
+            # stale connection from an earlier hop – one fresh attempt
+            await self._connect(addr)
+            payload = token_codec.encode(token, self.codec)
+            await write_frame(self.writer, payload)
+        return len(payload)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.addr, self.reader, self.writer = None, None, None
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+rollup.py  –  per-minute and per-hour rollups of the readings table
+  • rollup_minute / rollup_hour hold, per node and time bucket, count / sum /
+    min / max of every metric, so a dashboard view reads a bounded number of
+    rows however many raw samples there are
+  • db_writer's drainer calls add_rows() inside the same transaction that
+    inserts a batch, for the uids that batch really inserted; MySQL does
+    the grouping, and ON DUPLICATE KEY merges the batch into its buckets
+  • rebuild() recomputes both tables from the raw rows (first deployment,
+    or after a manual fix-up of raw data)
+Usage:
+    rollup.py --rebuild
+"""
+from storage import DB, TABLE, METRICS
+
+LEVELS  = {"rollup_minute": "%Y-%m-%d %H:%i:00",      # table → DATE_FORMAT of its bucket
+           "rollup_hour":   "%Y-%m-%d %H:00:00"}
+UID_CHUNK = 1000        # reading_uids per IN (...) list
+
+CREATE = ("CREATE TABLE IF NOT EXISTS {level} ("
+          " node SMALLINT UNSIGNED NOT NULL,"
+          " bucket DATETIME NOT NULL,"
+          + "".join(f" {m}_n INT UNSIGNED NOT NULL DEFAULT 0, {m}_sum DOUBLE NULL,"
+                    f" {m}_min DOUBLE NULL, {m}_max DOUBLE NULL," for m in METRICS)
+          + " PRIMARY KEY (bucket, node))")
+
+_AGG    = ", ".join(f"COUNT({m}), SUM({m}), MIN({m}), MAX({m})" for m in METRICS)
+_COLS   = ", ".join(f"{m}_n, {m}_sum, {m}_min, {m}_max" for m in METRICS)
+_MERGE  = ", ".join(f"{m}_n = {m}_n + VALUES({m}_n), "
+                    f"{m}_sum = COALESCE({m}_sum, 0) + COALESCE(VALUES({m}_sum), 0), "
+                    f"{m}_min = LEAST(COALESCE({m}_min, VALUES({m}_min)), COALESCE(VALUES({m}_min), {m}_min)), "
+                    f"{m}_max = GREATEST(COALESCE({m}_max, VALUES({m}_max)), COALESCE(VALUES({m}_max), {m}_max))"
+                    for m in METRICS)
+UPSERT  = ("INSERT INTO {level} (node, bucket, " + _COLS + ") "
+           "SELECT node_id, DATE_FORMAT(ts, %s), " + _AGG + f" FROM {TABLE} "
+           "WHERE {where} GROUP BY node_id, 2 "
+           "ON DUPLICATE KEY UPDATE " + _MERGE)
+
+
+def ensure_tables(cur):
+    for level in LEVELS:
+        cur.execute(CREATE.format(level=level))
+
+
+def existing_uids(cur, uids: list[str]) -> set[str]:
+    """The subset of uids already stored (replays of a batch MySQL has seen)."""
+    seen = set()
+    for i in range(0, len(uids), UID_CHUNK):
+        chunk = uids[i:i + UID_CHUNK]
+        cur.execute(f"SELECT reading_uid FROM {TABLE} WHERE reading_uid IN "
+                    f"({', '.join(['%s'] * len(chunk))})", chunk)
+        seen.update(u for (u,) in cur.fetchall())
+    return seen
+
+
+def add_rows(cur, uids: list[str]):
+    """Fold the raw rows with these reading_uids into both rollup levels."""
+    for i in range(0, len(uids), UID_CHUNK):
+        chunk = uids[i:i + UID_CHUNK]
+        where = f"reading_uid IN ({', '.join(['%s'] * len(chunk))})"
+        for level, fmt in LEVELS.items():
+            cur.execute(UPSERT.format(level=level, where=where), (fmt, *chunk))
+
+
+def rebuild(cnx):
+    cur = cnx.cursor()
+    try:
+        ensure_tables(cur)
+        for level, fmt in LEVELS.items():
+            cur.execute(f"DELETE FROM {level}")
+            cur.execute(UPSERT.format(level=level, where="1=1"), (fmt,))
+        cnx.commit()
+    finally:
+        cur.close()
+
+
+if __name__ == "__main__":
+    import sys, mysql.connector
+    if sys.argv[1:] != ["--rebuild"]:
+        print(__doc__); sys.exit(1)
+    cnx = mysql.connector.connect(**DB)
+    try:
+        rebuild(cnx)
+    finally:
+        cnx.close()
+    print(f"[rollup] rebuilt {', '.join(LEVELS)} from {TABLE}")
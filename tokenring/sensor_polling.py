@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
-import time
+import os, time, threading
+from collections import deque
 import board
 import busio
 from datetime import datetime
@@ -15,6 +16,21 @@ ANEM_MIN_VOLT    = 0.4
 ANEM_MAX_VOLT    = 2.0         
 MAX_WIND_SPEED   = 32.4        
 
+# background sampler: seconds between reads of each sensor, samples kept
+CADENCE = {"sht31": 2.0, "soil": 5.0, "wind": 0.5}
+HISTORY = 32
+
+# high-rate mode: these sensors are read RATE times a second into a NumPy
+# ring buffer and summarised (mean, gust max, std) once every WINDOW s
+FAST_RATE = {"wind": 25.0}
+WINDOW    = 5.0
+
+# polling log: kept open, buffered, rotated to LOG.1 … LOG.N past MAX_BYTES
+LOG_BUFFER     = 64 * 1024
+LOG_FLUSH_SECS = 10.0
+LOG_MAX_BYTES  = 1024 * 1024
+LOG_BACKUPS    = 3
+
 i2c = busio.I2C(board.SCL, board.SDA)
 
 sht31 = adafruit_sht31d.SHT31D(i2c)
@@ -42,6 +58,67 @@ def read_wind_speed():
                       0.0, MAX_WIND_SPEED)
     return v, speed
 
+def wind_from_volts(v):
+    """Vectorised read_wind_speed(): volts (scalar or array) → m/s."""
+    import numpy as np
+    v = np.clip(v, ANEM_MIN_VOLT, ANEM_MAX_VOLT)
+    return (v - ANEM_MIN_VOLT) * (MAX_WIND_SPEED / (ANEM_MAX_VOLT - ANEM_MIN_VOLT))
+
+
+class RotatingLog:
+    """
+    Append-only text log that stays open with a large write buffer: an entry
+    costs a memory copy, the disk sees one write every flush_every seconds,
+    and past max_bytes the file moves to path.1 (path.1 → path.2, ...).
+    """
+
+    def __init__(self, path=LOG, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS,
+                 flush_every=LOG_FLUSH_SECS):
+        self.path        = path
+        self.max_bytes   = max_bytes
+        self.backups     = backups
+        self.flush_every = flush_every
+        self.lock        = threading.Lock()
+        self._open()
+
+    def _open(self):
+        self.f       = open(self.path, "ab", buffering=LOG_BUFFER)
+        self.size    = self.f.seek(0, os.SEEK_END)
+        self.flushed = time.monotonic()
+
+    def write(self, text: str):
+        b = text.encode()
+        with self.lock:
+            self.f.write(b)
+            self.size += len(b)
+            if self.size >= self.max_bytes:
+                self._rotate()
+            elif time.monotonic() - self.flushed >= self.flush_every:
+                self.f.flush()
+                self.flushed = time.monotonic()
+
+    def _rotate(self):
+        self.f.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+
+_log = None
+
+def polling_log():
+    """The process-wide RotatingLog on LOG, opened on first use."""
+    global _log
+    if _log is None:
+        _log = RotatingLog()
+    return _log
+
 def log_readings():
     now = datetime.now().strftime("%m-%d-%Y %H:%M:%S")
     t, h      = read_temperature_humidity()
@@ -56,9 +133,23 @@ def log_readings():
         f"Soil Temperature: {soil_t:.3f}°C  \r\n"
         f"Wind speed: {wind:.3f} m/s\r\n\r\n"
     )
+    polling_log().write(line)
 
-    with open(LOG, "a") as f:
-        f.write(line)
+def log_window(reading, stats, log=None):
+    """Log entry of one high-rate window: latest() values plus window stats."""
+    now   = datetime.now().strftime("%m-%d-%Y %H:%M:%S")
+    line  = f"{now}  \n"
+    names = {"temperature": "Temperature", "humidity": "Humidity",
+             "soil_moisture": "Soil Moisture", "soil_temperature": "Soil Temperature",
+             "wind_speed": "Wind speed"}
+    for key, label in names.items():
+        st = stats.get(key)
+        if st:
+            line += (f"{label}: {st['mean']:.3f} (max {st['max']:.3f}, "
+                     f"std {st['std']:.3f}, n {st['n']})  \r\n")
+        elif reading.get(key) is not None:
+            line += f"{label}: {reading[key]:.3f}  \r\n"
+    (log or polling_log()).write(line + "\r\n")
 
 def get_local_measurements(node=None):
     """
@@ -82,9 +173,186 @@ def get_local_measurements(node=None):
         'node' : node
     }
 
+SENSORS = {
+    # name   : (read function, reading keys it fills)
+    "sht31": (read_temperature_humidity, ("temperature", "humidity")),
+    "soil":  (read_soil,                 ("soil_temperature", "soil_moisture")),
+    "wind":  (lambda: read_wind_speed()[1:], ("wind_speed",)),
+}
+
+FAST_SENSORS = {
+    # name   : (raw read function, vectorised conversion of the raw columns or None)
+    "sht31": (read_temperature_humidity, None),
+    "soil":  (read_soil,                 None),
+    "wind":  (lambda: (wind_chan.voltage,), wind_from_volts),
+}
+
+
+class FastBuffer:
+    """
+    Preallocated NumPy ring buffer of one high-rate sensor's raw samples:
+    a push is two array stores, nothing is allocated per sample.
+    """
+
+    def __init__(self, width, capacity):
+        import numpy as np                     # only the high-rate mode needs it
+        self.ts   = np.full(capacity, -np.inf)
+        self.vals = np.full((capacity, width), np.nan)
+        self.n    = 0                          # samples pushed so far
+
+    def push(self, ts, vals):
+        i = self.n % len(self.ts)
+        self.ts[i]   = ts
+        self.vals[i] = vals
+        self.n      += 1
+
+    def since(self, t0):
+        """Raw rows sampled at or after t0 (in buffer order, not time order)."""
+        return self.vals[self.ts >= t0]
+
+
+def window_stats(raw, keys, convert=None) -> dict:
+    """
+    Mean, max (the gust, for wind), std and sample count of every column of
+    one window, computed over the whole window at once.
+    """
+    import numpy as np
+    if convert is not None:
+        raw = convert(raw)
+    ok = ~np.isnan(raw)
+    n  = ok.sum(axis=0)
+    if not n.any():
+        return {}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(raw, axis=0)
+        peak = np.nanmax(raw, axis=0)
+        std  = np.nanstd(raw, axis=0)
+    return {k: dict(mean=float(mean[i]), max=float(peak[i]), std=float(std[i]), n=int(n[i]))
+            for i, k in enumerate(keys) if n[i]}
+
+
+class Sampler(threading.Thread):
+    """
+    Reads every sensor on its own cadence into a small ring buffer of
+    (monotonic ts, values).  Readers never touch the I2C bus: latest()
+    only looks at the buffers, so a slow or hung sensor just makes the
+    returned sample older instead of blocking the caller.
+
+    Sensors named in `fast` ({name: Hz}) are instead read at that rate into
+    a FastBuffer; every `window` seconds the sampler turns the window into
+    window_stats() and posts the means as that sensor's sample, so latest()
+    reports a window average rather than one instantaneous read.  With a
+    `log` (RotatingLog) every window is also logged with its gust and spread,
+    which the mean on the token does not carry.
+    """
+
+    def __init__(self, cadence=CADENCE, history=HISTORY, fast=None, window=WINDOW, log=None):
+        super().__init__(name="sensor-sampler", daemon=True)
+        self.fast    = dict(fast or {})
+        self.window  = window
+        self.cadence = {**cadence, **{name: 1.0 / hz for name, hz in self.fast.items()}}
+        self.buffers = {name: deque(maxlen=history) for name in self.cadence}
+        self.raw     = {name: FastBuffer(len(SENSORS[name][1]), int(hz * window * 2) + 1)
+                        for name, hz in self.fast.items()}
+        self.windows = {}                       # reading key → last window's stats
+        self.log     = log
+        self.lock    = threading.Lock()
+        self.ready   = threading.Event()      # set once every sensor answered
+
+    def run(self):
+        due = {name: 0.0 for name in self.cadence}
+        summary_due = time.monotonic() + self.window if self.fast else float("inf")
+        while True:
+            now = time.monotonic()
+            for name in self.cadence:
+                if now < due[name]:
+                    continue
+                read = FAST_SENSORS[name][0] if name in self.fast else SENSORS[name][0]
+                try:
+                    vals = read()
+                except Exception as e:                  # bad I2C transaction
+                    print(f"[sampler] {name} read failed: {e!r}")
+                else:
+                    if name in self.fast:
+                        self.raw[name].push(now, vals)  # sampler thread only, no lock
+                    else:
+                        self._post(name, vals)
+                due[name] = now + self.cadence[name]
+            if now >= summary_due:
+                self._summarize(summary_due - self.window)
+                summary_due += self.window
+            time.sleep(max(0.0, min(*due.values(), summary_due) - time.monotonic()))
+
+    def _post(self, name, vals):
+        with self.lock:
+            self.buffers[name].append((time.monotonic(), vals))
+            if all(self.buffers.values()):
+                self.ready.set()
+
+    def _summarize(self, t0):
+        for name in self.fast:
+            _, keys = SENSORS[name]
+            st = window_stats(self.raw[name].since(t0), keys, FAST_SENSORS[name][1])
+            if not st:
+                continue                        # every read of the window failed
+            with self.lock:
+                self.windows.update(st)
+            self._post(name, tuple(st[k]["mean"] if k in st else None for k in keys))
+        if self.log is not None:
+            log_window(self.latest()[0], self.stats(), self.log)
+
+    def stats(self) -> dict:
+        """{reading key: {mean, max, std, n}} of the last high-rate window."""
+        with self.lock:
+            return {k: dict(v) for k, v in self.windows.items()}
+
+    def history(self, name):
+        with self.lock:
+            return list(self.buffers[name])
+
+    def latest(self, node=None):
+        """
+        Freshest value of every sensor merged into one reading dict, plus
+        its age in seconds (age of the stalest sensor; inf if one never
+        answered yet, in which case its fields are None).
+        """
+        reading, stamps = {'node': node}, []
+        with self.lock:
+            for name, buf in self.buffers.items():
+                _, keys = SENSORS[name]
+                ts, vals = buf[-1] if buf else (None, (None,) * len(keys))
+                reading.update(zip(keys, vals))
+                stamps.append(ts)
+        if not stamps or None in stamps:
+            age = float("inf")
+        else:
+            age = time.monotonic() - min(stamps)
+        return reading, age
+
+
+_sampler = None
+
+def start_sampler(cadence=CADENCE, fast=None):
+    """
+    Start (once) and return the process-wide background sampler; in
+    high-rate mode it logs every window to the polling log.
+    """
+    global _sampler
+    if _sampler is None:
+        _sampler = Sampler(cadence, fast=fast, log=polling_log() if fast else None)
+        _sampler.start()
+    return _sampler
+
+def get_latest_measurements(node=None):
+    """Non-blocking twin of get_local_measurements(): (reading, age_seconds)."""
+    return start_sampler().latest(node)
+
 if __name__ == "__main__":
-    with open(LOG, "a") as f:
-        f.write("Isaac Garibay\n")
+    import sys
+    polling_log().write("Isaac Garibay\n")
+    if "--fast" in sys.argv[1:]:
+        # the sampler logs one entry per window: averages, gusts and spread
+        start_sampler(fast=FAST_RATE).join()
     while True:
         log_readings()
         time.sleep(5)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+series.py  –  downsampled time series of the readings (the dashboard's /api/readings)
+  • a request names nodes, metrics, a time range and a point budget; the
+    range is cut into equal buckets (about `points` of them) and MySQL
+    returns one row per node and bucket: count, mean, min, max per metric
+  • the rows come from the coarsest table that still resolves a bucket –
+    rollup_hour for buckets of an hour or more, rollup_minute for a minute
+    or more, the readings table below that – so the rows read stay around
+    points × nodes over any range
+  • method "lttb" instead picks `points` of the bucket means of a finer
+    pass (LTTB_OVERSAMPLE × as many buckets) with Largest-Triangle-Three-
+    Buckets, which keeps peaks and shape that plain averaging flattens
+  • version() is a cheap fingerprint of what a query would read (row count
+    and newest time): the ETag, so an unchanged range answers 304 before
+    the series query runs
+  • to_json() / to_csv() turn the series into response chunks as they are
+    produced, so nothing holds the whole payload
+"""
+import csv, io, json, math
+from datetime import datetime, timedelta
+from itertools import groupby
+import numpy as np
+from storage import TABLE, METRICS
+
+DEFAULT_POINTS  = 500
+MAX_POINTS      = 5000
+LTTB_OVERSAMPLE = 4
+METHODS = ("buckets", "lttb")
+SOURCES = (("rollup_hour", 3600), ("rollup_minute", 60), (TABLE, 0))   # table, smallest bucket it serves
+_EPOCH  = datetime(1970, 1, 1)
+
+
+def plan(start: datetime, end: datetime, points: int, method: str = "buckets"):
+    """
+    (start, end, bucket seconds, source table) for a request: a bucket is a
+    whole number of the source's own buckets, and the range is widened to
+    whole buckets, so a repeated request – however its "now" moved
+    within a bucket – asks for, and gets the ETag of, the same thing.
+    """
+    buckets = points * (LTTB_OVERSAMPLE if method == "lttb" else 1)
+    width   = max(1, math.ceil((end - start).total_seconds() / buckets))
+    table, smallest = next((t, s) for t, s in SOURCES if width >= s)
+    if smallest:                        # whole rollup buckets only, the same number in each
+        width = -(-width // smallest) * smallest
+    lo = (start - _EPOCH).total_seconds() // width * width
+    hi = -(-(end - _EPOCH).total_seconds() // width) * width
+    return _EPOCH + timedelta(seconds=lo), _EPOCH + timedelta(seconds=hi), width, table
+
+
+def _where(table, nodes):
+    tcol, ncol = ("ts", "node_id") if table == TABLE else ("bucket", "node")
+    where = f"{tcol} >= %s AND {tcol} < %s"
+    if nodes:
+        where += f" AND {ncol} IN ({', '.join(['%s'] * len(nodes))})"
+    return tcol, ncol, where
+
+
+def version(cur, table, start, end, nodes) -> tuple:
+    """Row count and newest time in range – changes whenever a query result would."""
+    tcol, _, where = _where(table, nodes)
+    count = "COUNT(*)" if table == TABLE else " + ".join(f"COALESCE(SUM({m}_n), 0)" for m in METRICS)
+    cur.execute(f"SELECT {count}, MAX({tcol}) FROM {table} WHERE {where}", (start, end, *nodes))
+    n, newest = cur.fetchall()[0]
+    return int(n or 0), str(newest)
+
+
+def query(table, start, end, width, nodes, metrics):
+    """SQL and parameters: (node, bucket index, n, mean, min, max per metric), by node then time."""
+    tcol, ncol, where = _where(table, nodes)
+    if table == TABLE:
+        cols = ", ".join(f"COUNT({m}), AVG({m}), MIN({m}), MAX({m})" for m in metrics)
+    else:
+        cols = ", ".join(f"SUM({m}_n), SUM({m}_sum) / NULLIF(SUM({m}_n), 0), MIN({m}_min), MAX({m}_max)"
+                         for m in metrics)
+    sql = (f"SELECT {ncol}, TIMESTAMPDIFF(SECOND, %s, {tcol}) DIV %s AS b, {cols} "
+           f"FROM {table} WHERE {where} GROUP BY {ncol}, b ORDER BY {ncol}, b")
+    return sql, (start, width, start, end, *nodes)
+
+
+def _num(v):
+    return None if v is None else float(v)
+
+
+def _iso(start, width, b):
+    return (start + timedelta(seconds=b * width)).isoformat() + "Z"
+
+
+def lttb(x, y, n: int) -> list[int]:
+    """Indices of n of the points (x, y), x ascending, by Largest-Triangle-Three-Buckets."""
+    size = len(x)
+    if size <= n:
+        return list(range(size))
+    if n < 3:
+        return [0, size - 1][:n]
+    x, y  = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)    # n-2 buckets between first and last
+    keep, a = [0], 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):                              # average of the next bucket
+            nx, ny = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:                                               # ... or the last point
+            nx, ny = x[-1], y[-1]
+        area = np.abs((x[a] - nx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ny - y[a]))
+        a = lo + int(area.argmax())
+        keep.append(a)
+    keep.append(size - 1)
+    return keep
+
+
+def series(rows, metrics, start, width, method="buckets", points=DEFAULT_POINTS):
+    """
+    One dict per node and metric from query() rows:
+      buckets: {node, metric, t, n, mean, min, max}   (t = bucket start, UTC)
+      lttb:    {node, metric, t, value}
+    """
+    for node, group in groupby(rows, key=lambda r: r[0]):
+        cols = {m: ([], [], [], [], []) for m in metrics}       # t, n, mean, min, max
+        for _, b, *vals in group:
+            for i, m in enumerate(metrics):
+                n, mean, lo, hi = vals[4 * i:4 * i + 4]
+                if n:
+                    for col, v in zip(cols[m], (b, int(n), _num(mean), _num(lo), _num(hi))):
+                        col.append(v)
+        for m in metrics:
+            b, n, mean, lo, hi = cols[m]
+            if method == "lttb":
+                pick = lttb(b, mean, points)
+                yield dict(node=node, metric=m, t=[_iso(start, width, b[i]) for i in pick],
+                           value=[mean[i] for i in pick])
+            else:
+                yield dict(node=node, metric=m, t=[_iso(start, width, x) for x in b],
+                           n=n, mean=mean, min=lo, max=hi)
+
+
+def to_json(head: dict, items):
+    """The response body in chunks: head's fields, then "series": [one item per chunk]."""
+    yield json.dumps(head)[:-1] + ', "series": ['
+    for k, item in enumerate(items):
+        yield ("," if k else "") + "\n" + json.dumps(item)
+    yield "\n]}\n"
+
+
+def to_csv(items, method="buckets"):
+    """The response body in chunks: one CSV row per point."""
+    fields = ("value",) if method == "lttb" else ("n", "mean", "min", "max")
+    buf = io.StringIO()
+    out = csv.writer(buf)
+    out.writerow(("node", "metric", "t") + fields)
+    for item in items:
+        for row in zip(item["t"], *(item[f] for f in fields)):
+            out.writerow((item["node"], item["metric"]) + row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
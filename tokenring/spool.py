@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+spool.py  –  local append-only write-ahead spool for readings
+  • every row headed for MySQL is appended here first (SQLite in WAL mode),
+    each with a uid that stays with it until MySQL has it
+  • the drainer in db_writer reads the oldest rows in big batches, inserts
+    them with INSERT IGNORE on that uid, and only then acks (deletes) them,
+    so a crash or replay can never duplicate a reading
+  • the spool survives restarts; whatever a node could not deliver is
+    replayed the next time it runs
+"""
+import sqlite3, threading, json, uuid
+
+SPOOL_PATH = "lap-spool.db"
+MAX_ROWS   = 1_000_000      # beyond this the oldest rows are discarded
+
+
+def new_uid() -> str:
+    return uuid.uuid4().hex
+
+
+class Spool:
+    def __init__(self, path: str = SPOOL_PATH, max_rows: int = MAX_ROWS):
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.db   = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS spool ("
+                        " seq  INTEGER PRIMARY KEY AUTOINCREMENT,"
+                        " uid  TEXT NOT NULL UNIQUE,"
+                        " tbl  TEXT NOT NULL,"
+                        " vals TEXT NOT NULL)")
+        self.count = self.db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def __len__(self):
+        return self.count
+
+    def append(self, rows: list[tuple[str, str, tuple]]):
+        """rows: (table, uid, values).  One transaction per call."""
+        if not rows:
+            return
+        with self.lock:
+            cur = self.db.cursor()
+            cur.execute("BEGIN")
+            cur.executemany("INSERT OR IGNORE INTO spool (uid, tbl, vals) VALUES (?, ?, ?)",
+                            [(uid, tbl, json.dumps(vals)) for tbl, uid, vals in rows])
+            added = cur.rowcount
+            over  = self.count + added - self.max_rows
+            if over > 0:
+                cur.execute("DELETE FROM spool WHERE seq IN "
+                            "(SELECT seq FROM spool ORDER BY seq LIMIT ?)", (over,))
+                print(f"[spool] full, discarded {over} oldest rows")
+            cur.execute("COMMIT")
+            self.count = self.count + added - max(0, over)
+
+    def peek(self, n: int) -> list[tuple[int, str, str, tuple]]:
+        """Oldest n rows as (seq, table, uid, values); nothing is removed."""
+        with self.lock:
+            rows = self.db.execute("SELECT seq, tbl, uid, vals FROM spool "
+                                   "ORDER BY seq LIMIT ?", (n,)).fetchall()
+        return [(seq, tbl, uid, tuple(json.loads(vals))) for seq, tbl, uid, vals in rows]
+
+    def ack(self, upto_seq: int):
+        """Forget every row up to and including upto_seq (it is in MySQL now)."""
+        with self.lock:
+            cur = self.db.execute("DELETE FROM spool WHERE seq <= ?", (upto_seq,))
+            self.count -= cur.rowcount
+
+    def close(self):
+        with self.lock:
+            self.db.close()
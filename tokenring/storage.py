@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+storage.py  –  one time-series table for every node's readings
+  • readings is keyed by (node_id, ts, reading_uid): rows of one node are
+    stored together in time order, and any ring size fits in one table
+  • KEY (ts) serves cross-node time ranges, KEY (reading_uid) lets the
+    writer tell replays from new rows
+  • optionally partitioned by month on ts (RANGE COLUMNS); old months can
+    then be dropped whole and time-range queries skip the other months
+  • migrate() copies the old per-node sensor_readingsN tables into it,
+    idempotently (a legacy row's uid is a hash of its contents)
+Usage:
+    storage.py --migrate [--partitioned]     create readings, copy old tables
+    storage.py --partitions                  add the coming months' partitions
+"""
+import re
+from datetime import date
+
+DB = dict(
+    host     = "192.168.0.132",        # laptop IP
+    port     = 3306,
+    user     = "primaryPi",
+    password = "theeIoTofGoats!",
+    database = "piSenseDB"
+)
+
+TABLE   = "readings"
+METRICS = ("temperature", "humidity", "wind_speed", "soil_moisture")
+COLUMNS = ("node_id", "ts", *METRICS, "topology_state", "reading_uid")
+LEGACY  = "sensor_readings%"          # LIKE pattern of the old per-node tables
+MONTHS_AHEAD = 3                      # partitions kept ready beyond this month
+
+CREATE = (f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+          " node_id SMALLINT UNSIGNED NOT NULL,"
+          " ts DATETIME(6) NOT NULL,"
+          + "".join(f" {m} DOUBLE NULL," for m in METRICS) +
+          " topology_state TEXT NULL,"
+          " reading_uid CHAR(32) NOT NULL,"
+          " PRIMARY KEY (node_id, ts, reading_uid),"
+          " KEY ix_ts (ts),"
+          " KEY ix_uid (reading_uid))")
+
+INSERT = (f"INSERT IGNORE INTO {TABLE} ({', '.join(COLUMNS)}) "
+          f"VALUES ({', '.join(['%s'] * len(COLUMNS))})")
+
+
+def node_of(table: str) -> int:
+    """sensor_readings3 → 3"""
+    return int(re.search(r"(\d+)$", table).group(1))
+
+
+def _month(d: date, ahead: int = 0) -> date:
+    m = d.month - 1 + ahead
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+def _partition(upto: date) -> str:
+    """Partition holding everything before `upto` (the first of a month)."""
+    prev = _month(upto, -1)
+    return f"PARTITION p{prev:%Y%m} VALUES LESS THAN ('{upto:%Y-%m-%d}')"
+
+
+def ensure_schema(cur, partitioned: bool = False):
+    ddl = CREATE
+    if partitioned:
+        this = _month(date.today())
+        parts = [_partition(_month(this, k)) for k in range(0, MONTHS_AHEAD + 2)]
+        ddl += (" PARTITION BY RANGE COLUMNS (ts) (" + ", ".join(parts) +
+                ", PARTITION pfuture VALUES LESS THAN (MAXVALUE))")
+    cur.execute(ddl)
+
+
+def partition_bounds(cur) -> list[str]:
+    """Upper bounds of the monthly partitions, oldest first; [] if unpartitioned."""
+    cur.execute("SELECT PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+                "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION", (TABLE,))
+    return [b.strip("'") for (b,) in cur.fetchall() if b != "MAXVALUE"]
+
+
+def ensure_partitions(cur, ahead: int = MONTHS_AHEAD):
+    """Split pfuture so the next `ahead` months each have a partition."""
+    bounds = partition_bounds(cur)
+    if not bounds:
+        return
+    have   = date.fromisoformat(bounds[-1][:10])
+    wanted = _month(date.today(), ahead + 1)
+    parts  = []
+    while have < wanted:
+        have = _month(have, 1)
+        parts.append(_partition(have))
+    if parts:
+        cur.execute(f"ALTER TABLE {TABLE} REORGANIZE PARTITION pfuture INTO (" +
+                    ", ".join(parts) + ", PARTITION pfuture VALUES LESS THAN (MAXVALUE))")
+        print(f"[storage] added {len(parts)} partition(s) to {TABLE}")
+
+
+def legacy_tables(cur) -> list[str]:
+    cur.execute(f"SHOW TABLES LIKE '{LEGACY}'")
+    return sorted((t for (t,) in cur.fetchall()), key=node_of)
+
+
+def migrate(cnx, partitioned: bool = False) -> dict[str, int]:
+    """Copy every sensor_readingsN into readings; safe to run again."""
+    cur = cnx.cursor()
+    copied = {}
+    try:
+        ensure_schema(cur, partitioned)
+        for table in legacy_tables(cur):
+            cur.execute(f"SHOW COLUMNS FROM {table} LIKE 'reading_uid'")
+            content = ("MD5(CONCAT_WS('|', %s, ts, " +
+                       ", ".join(f"COALESCE({m}, '')" for m in METRICS) +
+                       ", COALESCE(topology_state, '')))")
+            uid = f"COALESCE(reading_uid, {content})" if cur.fetchall() else content
+            cur.execute(f"INSERT IGNORE INTO {TABLE} ({', '.join(COLUMNS)}) "
+                        f"SELECT %s, ts, {', '.join(METRICS)}, topology_state, {uid} "
+                        f"FROM {table} WHERE ts IS NOT NULL",
+                        (node_of(table), node_of(table)))
+            copied[table] = cur.rowcount
+            cnx.commit()
+            print(f"[storage] {table}: {cur.rowcount} rows copied into {TABLE}")
+    finally:
+        cur.close()
+    return copied
+
+
+if __name__ == "__main__":
+    import sys, mysql.connector
+    import rollup
+    args = sys.argv[1:]
+    if args not in (["--migrate"], ["--migrate", "--partitioned"], ["--partitions"]):
+        print(__doc__); sys.exit(1)
+    cnx = mysql.connector.connect(**DB)
+    try:
+        if args[0] == "--migrate":
+            migrate(cnx, partitioned="--partitioned" in args)
+            rollup.rebuild(cnx)
+            print(f"[storage] rollups rebuilt; the old sensor_readingsN tables "
+                  f"can be dropped once nothing writes to them")
+        else:
+            cur = cnx.cursor()
+            ensure_partitions(cur)
+            cur.close()
+    finally:
+        cnx.close()
@@ -0,0 +1,93 @@
+"""deploymentDash.Forecast with a local stub source: no weather API involved."""
+import threading, time
+from deploymentDash import Forecast
+
+
+class Stub:
+    """A forecast source that answers (or raises) on cue and counts its calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate  = threading.Event()
+        self.gate.set()
+        self.fail  = False
+
+    def __call__(self):
+        self.calls += 1
+        self.gate.wait(5)
+        if self.fail:
+            raise OSError("weather API down")
+        return {"temperature": 20.0 + self.calls}
+
+
+def settle(fc):
+    """Wait for the background fetch, if any, to finish."""
+    deadline = time.monotonic() + 5
+    while fc.running and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert not fc.running
+
+
+def test_get_never_blocks():
+    src = Stub()
+    src.gate.clear()                            # the API hangs
+    fc = Forecast(src, ttl=60, retry=(30, 1800))
+    t0 = time.monotonic()
+    assert fc.get() == {}
+    assert fc.get() == {}
+    assert time.monotonic() - t0 < 0.5
+    src.gate.set()
+    settle(fc)
+    assert fc.get() == {"temperature": 21.0}
+    assert src.calls == 1                       # a fetch in flight is never started twice
+
+
+def test_stale_while_revalidate():
+    src = Stub()
+    fc = Forecast(src, ttl=60, retry=(30, 1800))
+    fc.get()
+    settle(fc)
+    assert fc.get() == {"temperature": 21.0} and src.calls == 1     # fresh: no refetch
+
+    fc.fetched -= 61                            # past its TTL
+    src.gate.clear()
+    assert fc.get() == {"temperature": 21.0}    # the stale value, at once
+    assert fc.get() == {"temperature": 21.0}
+    src.gate.set()
+    settle(fc)
+    assert src.calls == 2
+    assert fc.get() == {"temperature": 22.0}
+
+
+def test_backoff_after_failures():
+    src = Stub()
+    src.fail = True
+    fc = Forecast(src, ttl=60, retry=(30, 100))
+    for backoff in (30, 60, 100, 100):          # doubling, capped at retry[1]
+        fc.get()
+        settle(fc)
+        assert fc.backoff == backoff
+        calls = src.calls
+        assert fc.get() == {}                   # within the backoff: no new fetch
+        settle(fc)
+        assert src.calls == calls
+        fc.next_try = 0.0                       # the backoff ran out
+
+    src.fail = False
+    fc.get()
+    settle(fc)
+    assert fc.get() == {"temperature": 25.0}
+    assert fc.backoff == 0.0
+
+
+def test_failure_keeps_the_old_forecast():
+    src = Stub()
+    fc = Forecast(src, ttl=60, retry=(30, 1800))
+    fc.get()
+    settle(fc)
+    src.fail = True
+    fc.fetched -= 61
+    fc.get()
+    settle(fc)
+    assert fc.get() == {"temperature": 21.0}
+    assert fc.next_try > time.monotonic()
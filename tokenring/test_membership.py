@@ -0,0 +1,86 @@
+"""Membership merge rules (SWIM-style) and the token payload."""
+from membership import Membership, ALIVE, DEAD
+
+A, B, C, D = "a:1", "b:1", "c:1", "d:1"
+
+
+def view(me=A):
+    return Membership(me, [A, B, C])
+
+
+def test_healthy_payload_is_just_the_epoch():
+    m = view()
+    assert m.payload() == {"e": 0}
+    assert m.ring() == [A, B, C]
+
+
+def test_mark_dead_and_revive():
+    m = view()
+    assert m.mark_dead([B, A])              # never marks itself dead
+    assert m.ring() == [A, C]
+    assert m.payload() == {"e": 1, "m": {B: [DEAD, 0]}}
+    assert not m.mark_dead([B])             # already dead: no change, no new epoch
+    assert m.revive(B)
+    assert m.get(B) == (ALIVE, 1)           # back at a newer incarnation
+    assert m.ring() == [A, B, C]
+    assert not m.revive(B)
+
+
+def test_higher_incarnation_wins():
+    m = view()
+    m.mark_dead([B])
+    assert m.merge({"e": 5, "m": {B: [ALIVE, 1]}})
+    assert m.alive(B) and m.get(B) == (ALIVE, 1)
+    assert not m.merge({"e": 5, "m": {B: [DEAD, 0]}})      # stale rumour
+    assert m.alive(B)
+
+
+def test_dead_wins_at_equal_incarnation():
+    m = view()
+    assert m.merge({"e": 1, "m": {B: [DEAD, 0]}})
+    assert not m.alive(B)
+    assert not m.merge({"e": 1, "m": {B: [ALIVE, 0]}})
+    assert not m.alive(B)
+
+
+def test_refute_moves_to_next_incarnation():
+    m = view(me=B)
+    assert m.merge({"e": 3, "m": {B: [DEAD, 0]}})
+    assert m.get(B) == (ALIVE, 1)
+    assert m.payload()["m"] == {B: [ALIVE, 1]}
+    # the refutation beats the rumour wherever the two meet
+    other = view()
+    other.merge({"e": 3, "m": {B: [DEAD, 0]}})
+    assert other.merge(m.payload()) and other.alive(B)
+
+
+def test_refute_ignores_older_rumours():
+    m = view(me=B)
+    m.merge({"e": 1, "m": {B: [DEAD, 2]}})
+    assert m.get(B) == (ALIVE, 3)
+    assert not m.merge({"e": 1, "m": {B: [DEAD, 1]}})
+    assert m.get(B) == (ALIVE, 3)
+
+
+def test_joiner_is_appended_to_the_ring():
+    m = view()
+    assert m.merge({"e": 1, "m": {D: [ALIVE, 1]}})
+    assert m.ring() == [A, B, C, D]
+
+
+def test_join_heard_directly_reaches_the_rest():
+    a, b = view(me=A), view(me=B)
+    assert a.revive(D)
+    assert a.payload()["m"] == {D: [ALIVE, 1]}
+    assert b.merge(a.payload())
+    assert b.ring() == [A, B, C, D]
+    assert not a.revive(D)
+
+
+def test_epoch_never_goes_back():
+    m = view()
+    m.merge({"e": 9})
+    assert m.payload()["e"] == 9
+    m.merge({"e": 2, "m": {C: [DEAD, 0]}})
+    assert m.payload()["e"] == 10
+    assert not m.merge(None) and not m.merge({})
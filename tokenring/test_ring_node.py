@@ -0,0 +1,186 @@
+"""RingNode slot bookkeeping: duplicates, stale rounds and concurrent re-initiation."""
+import asyncio, socket, time
+import ring_node, token_codec
+from db_writer import LapWriter
+from ring_node import RingNode, outranks, summarize
+
+A, B, C = "127.0.0.1:1", "127.0.0.1:2", "127.0.0.1:3"
+READING = dict(temperature=20.0, humidity=50.0, soil_moisture=400.0,
+               soil_temperature=18.0, wind_speed=2.0)
+
+
+def sample():
+    return dict(READING), 0.0
+
+
+def node(me=B, ring=(A, B, C)):
+    n = RingNode("mid", me, list(ring), sample, None, plot_pause=0, retry_pause=0)
+    n.inbox, n.laps = asyncio.Queue(), asyncio.Queue()
+    n.slot_seen = {0: time.monotonic()}
+    n.sent = []
+
+    async def forward_token(token):
+        n.sent.append(token)
+        return True
+    n.forward_token = forward_token
+    return n
+
+
+def token(round_num, origin, readings=1):
+    return dict(source=origin, origin=origin, round=round_num, closed=False,
+                data=[dict(READING, node=i) for i in range(readings)])
+
+
+async def deliver(n, tok):
+    await n.inbox.put((token_codec.encode(tok), ("peer", 0), time.monotonic()))
+    return await n.recv_token()
+
+
+def laps(n):
+    out = []
+    while not n.laps.empty():
+        out += n.laps.get_nowait()
+    return out
+
+
+def test_outranks():
+    assert outranks((5, B), (4, A))
+    assert outranks((5, A), (5, B))
+    assert not outranks((5, B), (5, A))
+    assert not outranks((5, A), (5, A))
+
+
+def test_recv_deadline_staggers_by_position():
+    ring = [f"127.0.0.1:{p}" for p in range(1, 9)]
+    deadlines = []
+    for me in ring:
+        n = node(me=me, ring=ring)
+        for _ in range(10):
+            n.lap_fd.observe(0.005)             # millisecond laps: deadline at its floor
+        deadlines.append(n.recv_deadline())
+    gaps = [b - a for a, b in zip(deadlines, deadlines[1:])]
+    assert deadlines[0] == ring_node.RECV_FLOOR
+    assert min(gaps) >= 0.2                     # far more than a lap between positions
+
+
+def test_stale_round_is_dropped_but_its_readings_kept():
+    async def go():
+        n = node()
+        n.newest[0] = (7, A)
+        assert await deliver(n, token(4, C, readings=2)) == {}
+        assert len(laps(n)) == 2
+        assert n.metrics.counters["tokens_stale"] == 1
+    asyncio.run(go())
+
+
+def test_duplicate_copy_is_dropped():
+    async def go():
+        n = node()
+        n.newest[0], n.joined[0] = (3, A), (3, A, 2)
+        assert await deliver(n, token(3, A, readings=1)) == {}
+        assert n.metrics.counters["tokens_duplicate"] == 1
+        assert laps(n) == []
+    asyncio.run(go())
+
+
+def test_lap_closes_only_on_our_own_copy():
+    async def go():
+        n = node()
+        n.newest[0], n.joined[0] = (3, B), (3, B, 1)
+        tok = await deliver(n, token(3, B, readings=2))
+        await n.handle_token(tok)
+        await asyncio.gather(*n.pending)        # the next round's launch
+        assert [t["round"] for t in n.sent] == [4]
+        assert n.sent[0]["origin"] == B and n.sent[0]["lap"]["n"] == 2
+        assert len(laps(n)) == 2
+    asyncio.run(go())
+
+
+def test_concurrent_reinitiation_lower_origin_wins():
+    async def go():
+        b = node(me=B)
+        await b._reinitiate(0)                  # B started round 1 …
+        assert b.sent[-1]["origin"] == B and b.newest[0] == (1, B)
+        b.sent.clear()
+        laps(b)
+        # … and so did A: A's copy wins, B joins it instead of closing a lap
+        tok = await deliver(b, token(1, A))
+        await b.handle_token(tok)
+        assert [(t["round"], t["origin"], len(t["data"])) for t in b.sent] == [(1, A, 2)]
+        assert b.metrics.counters.get("laps", 0) == 0
+        # B's own copy coming back has lost: dropped, not closed as a lap
+        assert await deliver(b, token(1, B, readings=3)) == {}
+        assert len(laps(b)) == 3
+
+        a = node(me=A)
+        await a._reinitiate(0)
+        a.sent.clear()
+        assert await deliver(a, token(1, B, readings=2)) == {}
+        assert a.newest[0] == (1, A) and a.sent == []
+    asyncio.run(go())
+
+
+def test_summaries_of_summaries_are_weighted():
+    assert summarize([dict(READING), dict(READING, temperature=30.0)])["n"] == 2
+    upper = summarize([{"n": 3, "temperature": 10.0}, {"n": 1, "temperature": 20.0},
+                       {"n": 0}])
+    assert upper["n"] == 4 and upper["temperature"] == 12.5 and upper["humidity"] is None
+
+
+def test_summary_sample_is_not_stale(capsys):
+    lower = node(me=A)
+    upper = RingNode("mid", B, [A, B], lower.lap_summary, None)
+    assert lower.lap_summary() == ({"n": 0}, None)
+    assert upper.reading()["n"] == 0
+    lower._lap_done(dict(summarize([dict(READING)]), round=4))
+    assert upper.reading()["temperature"] == 20.0
+    assert "old" not in capsys.readouterr().out
+
+
+def free_ports(n):
+    socks = [socket.socket() for _ in range(n)]
+    for s in socks:
+        s.bind(("127.0.0.1", 0))
+    ports = [s.getsockname()[1] for s in socks]
+    for s in socks:
+        s.close()
+    return ports
+
+
+def test_ring_settles_on_one_token_after_concurrent_reinitiation(tmp_path):
+    addrs = [f"127.0.0.1:{p}" for p in free_ports(4)]
+    closed = []
+
+    def trace(addr, event, fields):
+        if event == "lap":
+            closed.append((fields["round"], fields["n"]))
+
+    async def go():
+        nodes = [RingNode("start" if i == 0 else "mid", a, addrs, sample,
+                          LapWriter(None, str(tmp_path / f"n{i}.db")),
+                          timeout=2, plot_pause=0.01, retry_pause=0.01, trace=trace)
+                 for i, a in enumerate(addrs)]
+        tasks = [asyncio.create_task(n.run()) for n in nodes[1:]]
+        await asyncio.sleep(0.2)
+        tasks.append(asyncio.create_task(nodes[0].run()))
+        await asyncio.sleep(0.5)
+        # two nodes both decide the token is lost, at the same moment and
+        # from the same newest round, so both start the same next round
+        top = max(n.newest[0] for n in nodes)
+        nodes[1].newest[0] = nodes[3].newest[0] = top
+        await asyncio.gather(nodes[1]._reinitiate(0), nodes[3]._reinitiate(0))
+        mark = len(closed)
+        await asyncio.sleep(1.0)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for n in nodes:
+            n.writer.close()
+        return mark
+
+    mark = asyncio.run(go())
+    after = closed[mark:]
+    rounds = [r for r, _ in after]
+    assert len(after) > 10
+    assert len(rounds) == len(set(rounds))                 # one lap per round
+    assert all(n == 4 for _, n in after[2:])               # full laps once settled
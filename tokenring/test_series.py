@@ -0,0 +1,82 @@
+"""series.plan() bucket alignment and source choice, lttb(), and the response writers."""
+import json, math
+from datetime import datetime, timedelta
+import pytest
+import series
+from series import plan, lttb
+
+T0 = datetime(2026, 1, 1, 0, 0, 7)
+
+
+def epoch_s(t):
+    return (t - series._EPOCH).total_seconds()
+
+
+@pytest.mark.parametrize("span, points, method, table, unit", [
+    (timedelta(minutes=5),  500, "buckets", "readings",      1),
+    (timedelta(hours=2),    100, "buckets", "rollup_minute", 60),
+    (timedelta(days=1),     500, "buckets", "rollup_minute", 60),
+    (timedelta(days=60),    500, "buckets", "rollup_hour",   3600),
+    (timedelta(days=60),    500, "lttb",    "rollup_minute", 60),
+])
+def test_plan_source_and_alignment(span, points, method, table, unit):
+    lo, hi, width, src = plan(T0, T0 + span, points, method)
+    assert src == table
+    assert width % unit == 0
+    assert lo <= T0 and T0 + span <= hi                   # widened, never cut
+    assert epoch_s(lo) % width == 0 and epoch_s(hi) % width == 0
+    buckets = points * (series.LTTB_OVERSAMPLE if method == "lttb" else 1)
+    assert (hi - lo).total_seconds() / width <= buckets + 1
+
+
+def test_plan_is_stable_within_a_bucket():
+    first = plan(T0, T0 + timedelta(days=1), 500)
+    assert first[2] == 180
+    later = T0 + timedelta(seconds=100)     # still inside the same 3-minute buckets
+    # a "now" that moved, but not past a bucket edge, gives the same plan (and ETag)
+    assert plan(later, later + timedelta(days=1), 500) == first
+
+
+def test_lttb_keeps_endpoints_and_peak():
+    x = list(range(1000))
+    y = [math.sin(i / 50) for i in x]
+    y[437] = 25.0
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert keep == sorted(set(keep))
+    assert 437 in keep
+
+
+def test_lttb_small_inputs():
+    assert lttb([1, 2, 3], [1, 2, 3], 5) == [0, 1, 2]
+    assert lttb(list(range(10)), list(range(10)), 2) == [0, 9]
+    assert lttb(list(range(10)), list(range(10)), 1) == [0]
+
+
+def rows():
+    # node, bucket, then (n, mean, min, max) per metric: temperature, humidity
+    return [(1, 0, 2, 20.0, 19.0, 21.0, 0, None, None, None),
+            (1, 2, 1, 22.0, 22.0, 22.0, 1, 50.0, 50.0, 50.0),
+            (2, 1, 1, 18.0, 18.0, 18.0, 1, 60.0, 60.0, 60.0)]
+
+
+def test_series_buckets_skip_empty_metrics():
+    start = datetime(2026, 1, 1)
+    out = list(series.series(rows(), ("temperature", "humidity"), start, 60))
+    assert [(s["node"], s["metric"]) for s in out] == [
+        (1, "temperature"), (1, "humidity"), (2, "temperature"), (2, "humidity")]
+    assert out[0]["t"] == ["2026-01-01T00:00:00Z", "2026-01-01T00:02:00Z"]
+    assert out[0]["n"] == [2, 1] and out[0]["max"] == [21.0, 22.0]
+    assert out[1]["t"] == ["2026-01-01T00:02:00Z"]          # the n=0 bucket is left out
+
+
+def test_writers():
+    start = datetime(2026, 1, 1)
+    items = list(series.series(rows(), ("temperature",), start, 60))
+    body = json.loads("".join(series.to_json({"width": 60}, iter(items))))
+    assert body["width"] == 60 and body["series"] == items
+    lines = "".join(series.to_csv(iter(items))).splitlines()
+    assert lines[0] == "node,metric,t,n,mean,min,max"
+    assert lines[1] == "1,temperature,2026-01-01T00:00:00Z,2,20.0,19.0,21.0"
+    assert len(lines) == 4
@@ -0,0 +1,91 @@
+"""Round trips through both codecs, and the HELLO negotiation."""
+import math
+import pytest
+import token_codec
+from token_codec import encode, decode, FIELDS, CodecError
+
+READING = dict(node=3, topology_state='{"n": 3}', temperature=21.5, humidity=40.25,
+               soil_moisture=512.0, soil_temperature=None, wind_speed=1.75)
+
+
+def token(**kw):
+    return dict(source="10.0.0.1:5000", data=[dict(READING)], round=7, closed=False, **kw)
+
+
+@pytest.mark.parametrize("codec", token_codec.CODECS)
+def test_round_trip(codec):
+    tok = token()
+    tok["data"].append(dict(READING, node=4, temperature=None))
+    assert decode(encode(tok, codec)) == tok
+
+
+def test_bin1_shares_topology_strings():
+    one = token()
+    two = token()
+    two["data"] += [dict(READING, node=n) for n in range(4, 20)]
+    # the same topology string, stored once: each reading adds only its fixed row
+    growth = len(encode(two)) - len(encode(one))
+    assert growth == 16 * token_codec._READING.size
+
+
+def test_bin1_missing_node_and_topology():
+    tok = token()
+    tok["data"] = [{k: None for k in ("node", *FIELDS)}]
+    assert decode(encode(tok)) == tok
+
+
+def test_bin1_closed_flag_and_empty_source():
+    tok = dict(source=None, data=[], round=2 ** 32 - 1, closed=True)
+    assert decode(encode(tok)) == tok
+
+
+def test_bin1_ext_carries_unknown_keys():
+    tok = token(members={"e": 3, "m": {"a:1": [0, 2]}}, trace=[1, 2])
+    tok["data"].append(dict(READING, node=5, gust_max=9.5, label="roof"))
+    out = decode(encode(tok))
+    assert out == tok
+    assert "_rx" not in out                 # reading extras are folded back, not left in the token
+
+
+def test_bin1_agg():
+    agg = {"temperature": [3, 64.5, 20.5, 22.0], "wind_speed": [1, 1.75, 1.75, 1.75]}
+    tok = token(agg=agg)
+    out = decode(encode(tok))
+    assert out["agg"] == agg                # float32-exact values; metrics with n=0 are left out
+    assert out["data"] == tok["data"]
+
+
+def test_bin1_agg_after_ext():
+    tok = token(agg={"humidity": [2, 80.5, 40.25, 40.25]}, note="x")
+    tok["data"][0]["extra"] = True
+    assert decode(encode(tok)) == tok
+
+
+def test_bin1_float32_precision():
+    tok = token()
+    tok["data"][0]["temperature"] = 21.3
+    got = decode(encode(tok))["data"][0]["temperature"]
+    assert got != 21.3 and math.isclose(got, 21.3, rel_tol=1e-6)
+
+
+def test_json_is_plain_json():
+    tok = token(agg={"humidity": [1, 1.0, 1.0, 1.0]})
+    assert encode(tok, "json").startswith(b"{")
+    assert decode(encode(tok, "json")) == tok
+
+
+def test_corrupt_bin1():
+    blob = encode(token())
+    with pytest.raises(CodecError):
+        decode(blob[:len(blob) // 2])
+    with pytest.raises(CodecError):
+        decode(blob[:2] + bytes([token_codec.VERSION + 1]) + blob[3:])
+
+
+def test_negotiation():
+    hello = token_codec.offer(("bin1", "json"))
+    assert token_codec.is_hello(hello)
+    assert token_codec.answer(hello) == b"bin1"
+    assert token_codec.answer(token_codec.offer(("json",))) == b"json"
+    assert token_codec.answer(token_codec.offer(("bin9",))) == b"json"
+    assert token_codec.answer(token_codec.HELLO + b"garbage") == b"json"
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+token_codec.py  –  wire encodings for ring tokens
+  • "bin1": compact, versioned binary token
+        magic "TK" | version | round | flags | source
+        topology table  – every distinct topology_state string, stored once
+        readings        – node, topology index, 5 × float32
+                          (temperature, humidity, soil_moisture,
+                           soil_temperature, wind_speed; NaN = missing)
+        ext             – JSON of any token / reading keys not listed above
+        agg (flag 0x02) – per metric: count u32, sum f64, min f32, max f32
+                          (streaming aggregates, see RingNode aggregate mode);
+                          after ext, so older decoders simply ignore it
+  • "json": the old json.dumps token, kept for debugging and old peers
+decode() recognises either format by its first bytes, so a receiver never
+needs to know which codec the sender picked.  Senders pick one per
+connection with a HELLO exchange (see offer()/answer()).
+"""
+import json, math, struct
+
+MAGIC    = b"TK"
+VERSION  = 1
+HELLO    = b"TKHELLO"
+CODECS   = ("bin1", "json")          # preference order
+
+_HEAD    = struct.Struct("!2sBIB")   # magic, version, round, flags
+_U16     = struct.Struct("!H")
+_U32     = struct.Struct("!I")
+_READING = struct.Struct("!hH5f")    # node, topo idx, 5 metrics
+_AGG     = struct.Struct("!Idff")    # count, sum, min, max of one metric
+FIELDS   = ("temperature", "humidity", "soil_moisture", "soil_temperature", "wind_speed")
+_KNOWN_TOKEN   = {"source", "data", "round", "closed", "agg"}
+_KNOWN_READING = {"node", "topology_state", *FIELDS}
+_NO_TOPO = 0xFFFF
+_NO_NODE = -1
+_CLOSED  = 0x01
+_HAS_AGG = 0x02
+
+
+class CodecError(Exception):
+    pass
+
+
+# ── negotiation ────────────────────────────────────────────────────────────
+def offer(codecs=CODECS) -> bytes:
+    """HELLO frame a sender writes first on every new successor connection."""
+    return HELLO + json.dumps({"codecs": list(codecs)}).encode()
+
+
+def is_hello(payload: bytes) -> bool:
+    return payload.startswith(HELLO)
+
+
+def answer(hello: bytes) -> bytes:
+    """Receiver's reply: the first offered codec it understands."""
+    try:
+        wanted = json.loads(hello[len(HELLO):].decode()).get("codecs", [])
+    except Exception:
+        wanted = []
+    return next((c for c in wanted if c in CODECS), "json").encode()
+
+
+# ── encode / decode ────────────────────────────────────────────────────────
+def _put_str(out: bytearray, s: str, size=_U16):
+    b = s.encode()
+    out += size.pack(len(b)) + b
+
+
+def _f(v):
+    return math.nan if v is None else float(v)
+
+
+def encode(token: dict, codec: str = "bin1") -> bytes:
+    if codec == "json":
+        return json.dumps(token).encode()
+
+    agg   = token.get("agg")
+    flags = (_CLOSED if token.get("closed") else 0) | (_HAS_AGG if agg is not None else 0)
+    out = bytearray(_HEAD.pack(MAGIC, VERSION, token.get("round", 0), flags))
+    _put_str(out, token.get("source") or "")
+
+    data   = token.get("data") or []
+    topos  = {}
+    for rec in data:
+        t = rec.get("topology_state")
+        if t is not None and t not in topos:
+            topos[t] = len(topos)
+    out += _U16.pack(len(topos))
+    for t in topos:
+        _put_str(out, t, _U32)
+
+    out += _U16.pack(len(data))
+    extra = {}
+    for i, rec in enumerate(data):
+        node = rec.get("node")
+        t    = rec.get("topology_state")
+        out += _READING.pack(_NO_NODE if node is None else node,
+                             _NO_TOPO if t is None else topos[t],
+                             *(_f(rec.get(k)) for k in FIELDS))
+        rest = {k: v for k, v in rec.items() if k not in _KNOWN_READING}
+        if rest:
+            extra[i] = rest
+
+    ext = {k: v for k, v in token.items() if k not in _KNOWN_TOKEN}
+    if extra:
+        ext["_rx"] = extra
+    blob = json.dumps(ext).encode() if ext else b""
+    out += _U32.pack(len(blob)) + blob
+    if agg is not None:
+        for k in FIELDS:
+            n, total, lo, hi = agg.get(k) or (0, 0.0, math.nan, math.nan)
+            out += _AGG.pack(n, total, lo, hi)
+    return bytes(out)
+
+
+def decode(payload: bytes) -> dict:
+    if not payload.startswith(MAGIC):
+        return json.loads(payload.decode())
+    try:
+        return _decode_bin(memoryview(payload))
+    except (struct.error, UnicodeDecodeError, ValueError, IndexError) as e:
+        raise CodecError(f"corrupt binary token: {e!r}") from None
+
+
+def _decode_bin(buf) -> dict:
+    magic, version, round_num, flags = _HEAD.unpack_from(buf, 0)
+    if version != VERSION:
+        raise CodecError(f"unsupported token version {version}")
+    pos = _HEAD.size
+
+    def get_str(size=_U16):
+        nonlocal pos
+        (n,) = size.unpack_from(buf, pos); pos += size.size
+        s = bytes(buf[pos:pos + n]).decode(); pos += n
+        return s
+
+    source = get_str()
+    (ntopo,) = _U16.unpack_from(buf, pos); pos += _U16.size
+    topos = [get_str(_U32) for _ in range(ntopo)]
+
+    (nread,) = _U16.unpack_from(buf, pos); pos += _U16.size
+    data = []
+    for _ in range(nread):
+        node, ti, *vals = _READING.unpack_from(buf, pos); pos += _READING.size
+        rec = {k: (None if math.isnan(v) else v) for k, v in zip(FIELDS, vals)}
+        rec["node"] = None if node == _NO_NODE else node
+        if ti != _NO_TOPO:
+            rec["topology_state"] = topos[ti]
+        data.append(rec)
+
+    (next_,) = _U32.unpack_from(buf, pos); pos += _U32.size
+    ext = json.loads(bytes(buf[pos:pos + next_]).decode()) if next_ else {}
+    pos += next_
+    for i, rest in ext.pop("_rx", {}).items():
+        data[int(i)].update(rest)
+
+    token = {"source": source or None, "data": data, "round": round_num,
+             "closed": bool(flags & _CLOSED)}
+    if flags & _HAS_AGG:
+        agg = {}
+        for k in FIELDS:
+            n, total, lo, hi = _AGG.unpack_from(buf, pos); pos += _AGG.size
+            if n:
+                agg[k] = [n, total, lo, hi]
+        token["agg"] = agg
+    token.update(ext)
+    return token